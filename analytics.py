@@ -0,0 +1,186 @@
+"""
+Per-group and per-supplier inventory summaries.
+
+`item_summary` holds running counts and sums (and margin min/max) for every
+group and supplier. On SQLite, triggers on `item` update it incrementally, so
+every write path (add item, imports, batch writes, repricing, deletes) keeps
+it current and a dashboard read costs O(number of groups). A removed row that
+held a group's min or max margin triggers a recompute of that bound only, using
+the (item_group|supplier, margin_sale) indexes. Other databases fall back to
+GROUP BY. `flask rebuild-aggregates` recomputes everything from scratch.
+
+Margins are sale-price margins (`margin_sale`) and only count items with a
+purchase price; items without one would otherwise show as 0% margin.
+"""
+from sqlalchemy import text
+from extensions import db
+from models import ItemSummary, ROW_TRIGGERS_ACTIVE
+
+
+# dimension -> item column
+DIMENSIONS = {'group': 'item_group', 'supplier': 'supplier'}
+
+_HAS_KEY = "{row}.{col} IS NOT NULL AND trim({row}.{col}) != ''"
+_PRICED = "{row}.purc_price > 0"
+
+_ADD = """INSERT INTO item_summary (dimension, key, item_count, priced_count, margin_sum, margin_min,
+            margin_max, purc_count, purc_sum, sale_count, sale_sum)
+        SELECT '{dim}', new.{col}, 1,
+            CASE WHEN new.purc_price > 0 THEN 1 ELSE 0 END,
+            CASE WHEN new.purc_price > 0 THEN new.margin_sale ELSE 0 END,
+            CASE WHEN new.purc_price > 0 THEN new.margin_sale END,
+            CASE WHEN new.purc_price > 0 THEN new.margin_sale END,
+            new.purc_price IS NOT NULL, coalesce(new.purc_price, 0),
+            new.sale_price IS NOT NULL, coalesce(new.sale_price, 0)
+        WHERE {has_key}
+        ON CONFLICT(dimension, key) DO UPDATE SET
+            item_count = item_count + 1,
+            priced_count = priced_count + excluded.priced_count,
+            margin_sum = margin_sum + excluded.margin_sum,
+            margin_min = coalesce(min(margin_min, excluded.margin_min), margin_min, excluded.margin_min),
+            margin_max = coalesce(max(margin_max, excluded.margin_max), margin_max, excluded.margin_max),
+            purc_count = purc_count + excluded.purc_count,
+            purc_sum = purc_sum + excluded.purc_sum,
+            sale_count = sale_count + excluded.sale_count,
+            sale_sum = sale_sum + excluded.sale_sum;"""
+
+_SUB = """UPDATE item_summary SET
+            item_count = item_count - 1,
+            priced_count = priced_count - (CASE WHEN old.purc_price > 0 THEN 1 ELSE 0 END),
+            margin_sum = margin_sum - (CASE WHEN old.purc_price > 0 THEN old.margin_sale ELSE 0 END),
+            purc_count = purc_count - (old.purc_price IS NOT NULL),
+            purc_sum = purc_sum - coalesce(old.purc_price, 0),
+            sale_count = sale_count - (old.sale_price IS NOT NULL),
+            sale_sum = sale_sum - coalesce(old.sale_price, 0)
+        WHERE dimension = '{dim}' AND key = old.{col};
+        DELETE FROM item_summary WHERE dimension = '{dim}' AND key = old.{col} AND item_count <= 0;"""
+
+# only when the removed row held a bound: re-read it with an index seek
+_BOUNDS = """UPDATE item_summary SET
+            margin_min = (SELECT min(margin_sale) FROM item WHERE {col} = old.{col} AND purc_price > 0),
+            margin_max = (SELECT max(margin_sale) FROM item WHERE {col} = old.{col} AND purc_price > 0)
+        WHERE dimension = '{dim}' AND key = old.{col} AND old.purc_price > 0
+            AND (margin_min >= old.margin_sale OR margin_max <= old.margin_sale);"""
+
+
+def _triggers():
+    triggers = {}
+    for dim, col in DIMENSIONS.items():
+        fmt = {'dim': dim, 'col': col, 'has_key': _HAS_KEY.format(row='new', col=col)}
+        add, sub, bounds = _ADD.format(**fmt), _SUB.format(**fmt), _BOUNDS.format(**fmt)
+        triggers[f'item_summary_{dim}_ai'] = f"""CREATE TRIGGER IF NOT EXISTS item_summary_{dim}_ai
+        AFTER INSERT ON item WHEN {ROW_TRIGGERS_ACTIVE} BEGIN
+        {add}
+    END"""
+        triggers[f'item_summary_{dim}_ad'] = f"""CREATE TRIGGER IF NOT EXISTS item_summary_{dim}_ad
+        AFTER DELETE ON item BEGIN
+        {sub}
+        {bounds}
+    END"""
+        # one trigger for both sides of an update so the steps run in this order
+        triggers[f'item_summary_{dim}_au'] = f"""CREATE TRIGGER IF NOT EXISTS item_summary_{dim}_au
+        AFTER UPDATE OF {col}, purc_price, sale_price ON item BEGIN
+        {sub}
+        {add}
+        {bounds}
+    END"""
+    return triggers
+
+
+SUMMARY_TRIGGERS = _triggers()
+
+# engine -> bool, resolved once per engine
+_summary_state = {}
+
+
+def _summary_select(dim, col, where=None):
+    """GROUP BY over item producing item_summary rows for one dimension (optionally of a subset)."""
+    return f"""SELECT '{dim}' AS dimension, {col} AS key, count(*) AS item_count,
+            sum(CASE WHEN purc_price > 0 THEN 1 ELSE 0 END) AS priced_count,
+            coalesce(sum(CASE WHEN purc_price > 0 THEN margin_sale END), 0) AS margin_sum,
+            min(CASE WHEN purc_price > 0 THEN margin_sale END) AS margin_min,
+            max(CASE WHEN purc_price > 0 THEN margin_sale END) AS margin_max,
+            count(purc_price) AS purc_count, coalesce(sum(purc_price), 0) AS purc_sum,
+            count(sale_price) AS sale_count, coalesce(sum(sale_price), 0) AS sale_sum
+        FROM item WHERE {_HAS_KEY.format(row='item', col=col)}{f' AND {where}' if where else ''}
+        GROUP BY {col}"""
+
+
+_SUMMARY_COLUMNS = ("INSERT INTO item_summary (dimension, key, item_count, priced_count, margin_sum, "
+                    "margin_min, margin_max, purc_count, purc_sum, sale_count, sale_sum) ")
+
+# a deferred bulk insert folds its rows in with one GROUP BY per dimension
+SUMMARY_BATCH_SQL = [
+    _SUMMARY_COLUMNS + _summary_select(dim, col, where='item.id > :after') + """
+        ON CONFLICT(dimension, key) DO UPDATE SET
+            item_count = item_count + excluded.item_count,
+            priced_count = priced_count + excluded.priced_count,
+            margin_sum = margin_sum + excluded.margin_sum,
+            margin_min = coalesce(min(margin_min, excluded.margin_min), margin_min, excluded.margin_min),
+            margin_max = coalesce(max(margin_max, excluded.margin_max), margin_max, excluded.margin_max),
+            purc_count = purc_count + excluded.purc_count,
+            purc_sum = purc_sum + excluded.purc_sum,
+            sale_count = sale_count + excluded.sale_count,
+            sale_sum = sale_sum + excluded.sale_sum"""
+    for dim, col in DIMENSIONS.items()
+]
+
+
+def _has_triggers(conn):
+    names = {r[0] for r in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'item_summary_%'"))}
+    return set(SUMMARY_TRIGGERS) <= names
+
+
+def install_summaries(conn):
+    """Create the maintenance triggers (SQLite only); rebuild on first install."""
+    if conn.dialect.name != 'sqlite':
+        return False
+    fresh = not _has_triggers(conn)
+    for ddl in SUMMARY_TRIGGERS.values():
+        conn.execute(text(ddl))
+    if fresh:
+        rebuild_summaries(conn)
+    return True
+
+
+def rebuild_summaries(conn):
+    """Recompute every summary row from the item table."""
+    conn.execute(text("DELETE FROM item_summary"))
+    for dim, col in DIMENSIONS.items():
+        conn.execute(text(_SUMMARY_COLUMNS + _summary_select(dim, col)))
+
+
+def summaries_enabled():
+    engine = db.engine
+    if engine not in _summary_state:
+        enabled = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                enabled = _has_triggers(conn)
+        _summary_state[engine] = enabled
+    return _summary_state[engine]
+
+
+def _avg(total, n):
+    return round(total / n, 2) if n else None
+
+
+def summaries(dimension):
+    """Summary dicts for one dimension ('group' or 'supplier'), ordered by key."""
+    if summaries_enabled():
+        rows = db.session.query(ItemSummary).filter(ItemSummary.dimension == dimension) \
+            .order_by(ItemSummary.key).all()
+    else:
+        rows = db.session.execute(text(
+            _summary_select(dimension, DIMENSIONS[dimension]) + " ORDER BY key")).all()
+    return [{
+        'key': r.key,
+        'item_count': r.item_count,
+        'priced_count': r.priced_count,
+        'avg_margin': _avg(r.margin_sum, r.priced_count),
+        'min_margin': round(r.margin_min, 2) if r.margin_min is not None else None,
+        'max_margin': round(r.margin_max, 2) if r.margin_max is not None else None,
+        'avg_purc_price': _avg(r.purc_sum, r.purc_count),
+        'avg_sale_price': _avg(r.sale_sum, r.sale_count),
+    } for r in rows]
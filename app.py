@@ -1,22 +1,37 @@
 # app.py
 import os
+import json
+import time
 import logging
+import click
 from flask import Flask, jsonify
 from extensions import db
 from config import config
+from import_jobs import import_jobs
+from metrics import metrics
+from slow_queries import slow_queries
+from suggest import suggest_index
+from startup import StartupTimer
 
 def create_app(config_name=None):
     """Application factory pattern"""
+    timer = StartupTimer()
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'development')
 
-    app = Flask(__name__, static_folder="static", template_folder="templates")
+    with timer.phase('config'):
+        app = Flask(__name__, static_folder="static", template_folder="templates")
 
-    # Load configuration
-    app.config.from_object(config.get(config_name, config['default']))
+        # Load configuration
+        app.config.from_object(config.get(config_name, config['default']))
 
     # Initialize extensions
-    db.init_app(app)
+    with timer.phase('extensions'):
+        db.init_app(app)
+        import_jobs.init_app(app)
+        metrics.init_app(app)
+        slow_queries.init_app(app)
+        suggest_index.init_app(app)
 
     # Configure logging
     if not app.debug and not app.testing:
@@ -28,16 +43,75 @@ def create_app(config_name=None):
     # Import models
     import models  # noqa: F401
 
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Create database tables and apply additive upgrades to older databases,
+    # skipped while the stored schema fingerprint matches
+    from startup import ensure_schema
+    from sqlite_profile import init_sqlite_profile
+    with timer.phase('schema'), app.app_context():
+        init_sqlite_profile(app, db)
+        timer.notes['schema'] = ensure_schema(app)
 
     # Register blueprints
-    from routes.add_item import add_item_bp
-    from routes.records import records_bp
+    with timer.phase('blueprints'):
+        from routes.add_item import add_item_bp
+        from routes.records import records_bp
+        from routes.batch import batch_bp
+        from routes.analytics import analytics_bp
+        from routes.changes import changes_bp
 
-    app.register_blueprint(add_item_bp)
-    app.register_blueprint(records_bp)
+        app.register_blueprint(add_item_bp)
+        app.register_blueprint(records_bp)
+        app.register_blueprint(batch_bp)
+        app.register_blueprint(analytics_bp)
+        app.register_blueprint(changes_bp)
+
+        # slow-query report page: development or when explicitly enabled
+        if app.config.get('SLOW_QUERY_MS') and (app.debug or app.config.get('SLOW_QUERY_REPORT')):
+            from routes.debug import debug_bp
+            app.register_blueprint(debug_bp)
+
+    # flask rebuild-aggregates: recompute search index, group catalog and summaries
+    @app.cli.command('rebuild-aggregates')
+    def rebuild_aggregates():
+        from schema import rebuild_derived
+        rebuilt = rebuild_derived()
+        print(f"Rebuilt: {', '.join(rebuilt)}" if rebuilt else "Nothing to rebuild on this database.")
+
+    # flask refresh-signatures: backfill near-duplicate signatures for items that lack one
+    @app.cli.command('refresh-signatures')
+    @click.option('--chunk-size', default=5000, show_default=True, help='Items hashed and written per transaction.')
+    def refresh_signatures_cmd(chunk_size):
+        from dedup import refresh_signatures
+        print(f"Signed {refresh_signatures(chunk_size=chunk_size)} items.")
+
+    # flask reparse-items: re-derive group / MRP / units from descriptions and sizes
+    @app.cli.command('reparse-items')
+    @click.option('--chunk-size', default=2000, show_default=True, help='Rows read and updated per transaction.')
+    @click.option('--overwrite', is_flag=True, help='Replace existing values, not only empty ones.')
+    def reparse_items(chunk_size, overwrite):
+        from parsing import reparse_catalog
+        stats = reparse_catalog(chunk_size=chunk_size, overwrite=overwrite)
+        print(f"Scanned {stats['scanned']} items, updated {stats['updated']}.")
+
+    # flask compact-changes: drop superseded change-log rows and expired tombstones
+    @app.cli.command('compact-changes')
+    @click.option('--tombstone-days', type=int, default=None,
+                  help='Keep deletes this many days (default: CHANGES_TOMBSTONE_DAYS).')
+    def compact_changes_cmd(tombstone_days):
+        from changes import changes_enabled, compact_changes
+        if not changes_enabled():
+            print("No change log on this database.")
+            return
+        if tombstone_days is None:
+            tombstone_days = app.config.get('CHANGES_TOMBSTONE_DAYS', 30)
+        stats = compact_changes(tombstone_days)
+        print(f"Removed {stats['superseded']} superseded rows and {stats['tombstones']} tombstones; "
+              f"tokens below {stats['horizon']} must resync.")
+
+    # flask startup-report: phase timings of this create_app() run
+    @app.cli.command('startup-report')
+    def startup_report():
+        print(json.dumps(app.extensions['startup'], indent=2))
 
     # Error handlers
     @app.errorhandler(404)
@@ -61,10 +135,36 @@ def create_app(config_name=None):
             'message': 'File too large. Maximum size is 16MB.'
         }), 413
 
-    # Health check endpoint
+    # Health check endpoint: a round trip to the database, timed
     @app.route('/health')
     def health():
-        return jsonify({'status': 'healthy'}), 200
+        from sqlalchemy import text
+        t0 = time.perf_counter()
+        try:
+            db.session.execute(text('SELECT 1')).scalar()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'Health check failed: {e}')
+            return jsonify({'status': 'unhealthy', 'error': str(getattr(e, 'orig', e))}), 503
+        latency = time.perf_counter() - t0
+        metrics.db_health_seconds = latency
+        latency_ms = round(latency * 1000, 2)
+        status = 'healthy' if latency_ms <= app.config.get('HEALTH_MAX_DB_LATENCY_MS', 250) else 'degraded'
+        return jsonify({'status': status, 'db_latency_ms': latency_ms}), 200
+
+    # Prometheus text exposition of the request / SQL metrics
+    if app.config.get('METRICS_ENABLED', True):
+        @app.route('/metrics')
+        def prometheus_metrics():
+            return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    if app.config.get('STARTUP_PREWARM'):
+        from startup import prewarm
+        with timer.phase('prewarm'):
+            prewarm(app)
+
+    app.extensions['startup'] = timer.report()
+    app.logger.info("Startup: %s", app.extensions['startup'])
 
     return app
 
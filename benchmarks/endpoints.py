@@ -0,0 +1,281 @@
+"""
+Endpoint benchmark suite: the hot read/write endpoints against synthetic
+catalogs of increasing size, run through the Flask test client.
+
+For each catalog size a fresh SQLite file is seeded (in its own process, so
+peak RSS is per size) and every scenario is timed over --repeat calls.
+Reports p50/p90/p99/max latency, rows/s and peak traced memory per scenario
+as JSON, so results from two releases can be diffed.
+
+    python benchmarks/endpoints.py [--sizes 10000,100000,1000000] [--repeat 20] [--output out.json]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GROUPS = ['HYGIENE', 'GROCERY', 'BEVERAGES', 'SNACKS', 'DAIRY', 'HOUSEHOLD', 'PERSONAL CARE', 'STATIONERY']
+PRODUCTS = {
+    'HYGIENE': ['SOAP', 'HANDWASH', 'SANITIZER', 'TOOTHPASTE', 'SHAMPOO'],
+    'GROCERY': ['BASMATI RICE', 'TOOR DAL', 'SUGAR', 'ATTA', 'SALT'],
+    'BEVERAGES': ['TEA', 'COFFEE', 'MANGO DRINK', 'SODA', 'GREEN TEA'],
+    'SNACKS': ['BISCUIT', 'NAMKEEN', 'CHIPS', 'COOKIES', 'RUSK'],
+    'DAIRY': ['GHEE', 'BUTTER', 'PANEER', 'CHEESE', 'CURD'],
+    'HOUSEHOLD': ['DETERGENT', 'DISHWASH BAR', 'FLOOR CLEANER', 'AGARBATTI', 'MATCHBOX'],
+    'PERSONAL CARE': ['FACE WASH', 'HAIR OIL', 'TALC', 'CREAM', 'DEODORANT'],
+    'STATIONERY': ['NOTEBOOK', 'PEN', 'PENCIL', 'ERASER', 'GLUE STICK'],
+}
+SIZES = ['50G', '100G', '200G', '500G', '1KG', '100ML', '250ML', '1L']
+SUPPLIERS = [f'{name} TRADERS' for name in ('ACME', 'SHREE', 'BALAJI', 'GANESH', 'KRISHNA', 'MAHALAXMI')] + \
+    [f'{name} DISTRIBUTORS' for name in ('OM', 'SAI', 'JAI HIND', 'NEW INDIA')]
+
+SEED_CHUNK = 10000
+
+
+def synthetic_item(i, rng):
+    group = GROUPS[i % len(GROUPS)]
+    product = rng.choice(PRODUCTS[group])
+    size = rng.choice(SIZES)
+    mrp = rng.randrange(10, 500)
+    purc = round(mrp * rng.uniform(0.55, 0.85), 2)
+    sale = round(purc * rng.uniform(0.95, 1.35), 2)
+    # the index keeps every description unique, as the real catalog is
+    description = f"{product} {size} ({group}) {mrp}/- #{i}"
+    return {
+        'description': description, 'item_group': group, 'mrp': mrp, 'item_size': '1CTN=20PKD',
+        'main_unit': 'CTN', 'alt_unit': 'PKD', 'alt_qty': 20, 'purc_price': purc,
+        'bulk_sp1': round(sale * 0.97, 2), 'bulk_sp2': round(sale * 0.95, 2), 'sale_price': sale,
+        'supplier': rng.choice(SUPPLIERS),
+    }
+
+
+def seed(size, rng):
+    from extensions import db
+    from models import Item, normalize_description
+    base = datetime(2024, 1, 1)
+    table = Item.__table__
+    for start in range(0, size, SEED_CHUNK):
+        rows = []
+        for i in range(start, min(size, start + SEED_CHUNK)):
+            row = synthetic_item(i, rng)
+            row['description_key'] = normalize_description(row['description'])
+            row['last_updated'] = base + timedelta(seconds=i)
+            rows.append(row)
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def import_csv(start, count, rng):
+    out = io.StringIO()
+    out.write('description,group,mrp,size,main_unit,alt_unit,alt_qty,purc_price,bulk_sp1,bulk_sp2,sale_price,supplier\n')
+    for i in range(start, start + count):
+        r = synthetic_item(i, rng)
+        out.write(f"{r['description']},{r['item_group']},{r['mrp']},{r['item_size']},{r['main_unit']},"
+                  f"{r['alt_unit']},{r['alt_qty']},{r['purc_price']},{r['bulk_sp1']},{r['bulk_sp2']},"
+                  f"{r['sale_price']},{r['supplier']}\n")
+    return out.getvalue().encode('utf-8')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def run_scenario(call, repeat):
+    """Time `call` (which returns the number of rows it handled) and trace one extra call's memory."""
+    call()  # warm up
+    latencies, rows = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = call()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mean = sum(latencies) / len(latencies)
+    return {
+        'calls': repeat,
+        'rows_per_call': rows,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p90_ms': round(percentile(latencies, 90), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+        'mean_ms': round(mean, 2),
+        'rows_per_s': round(rows / (mean / 1000), 1) if mean else None,
+        'peak_traced_kib': round(peak / 1024, 1),
+    }
+
+
+def scenarios(client, size):
+    def get_json(url):
+        resp = client.get(url)
+        assert resp.status_code == 200, (url, resp.status_code)
+        return resp.get_json()
+
+    def get(url, rows):
+        def call():
+            resp = client.get(url)
+            assert resp.status_code == 200, (url, resp.status_code)
+            return rows
+        return call
+
+    def api(url):
+        return lambda: len(get_json(url)['items'])
+
+    def cursor_walk(pages=5, per_page=200):
+        def call():
+            cursor, n = '', 0
+            for _ in range(pages):
+                data = get_json(f'/api/records?per_page={per_page}&cursor={cursor}')
+                n += len(data['items'])
+                if not data['next_cursor']:
+                    break
+                cursor = data['next_cursor']
+            return n
+        return call
+
+    def csv_export():
+        resp = client.get('/records?format=csv')
+        body = resp.get_data()
+        assert resp.status_code == 200
+        return body.count(b'\n') - 1
+
+    def xlsx_export():
+        resp = client.get('/records?format=xlsx')
+        body = resp.get_data()
+        assert resp.status_code == 200 and body[:2] == b'PK'
+        return size
+
+    deep_page = max(1, size // 12 // 2)
+    return {
+        'records_first_page': get('/records', 12),
+        'records_deep_page': get(f'/records?page={deep_page}', 12),
+        'records_search': get('/records?q=soap+100g', 12),
+        'records_cursor_first_page': get('/records?cursor=', 12),
+        'api_records_200': api('/api/records?per_page=200'),
+        'api_records_deep_page': api(f'/api/records?per_page=200&page={max(1, size // 200 // 2)}'),
+        'api_records_search': api('/api/records?q=basmati+1kg&per_page=50'),
+        'api_records_group_margin': api('/api/records?group=HYGIENE&margin_max=5&per_page=50'),
+        'api_records_sort_margin': api('/api/records?sort=-margin&per_page=50'),
+        'api_records_cursor_walk': cursor_walk(),
+        'api_analytics': lambda: sum(len(v) for v in get_json('/api/analytics').values()),
+        'api_changes_page': lambda: len(get_json('/api/changes?since=0&limit=1000')['upserts']),
+        'csv_export': csv_export,
+        'xlsx_export': xlsx_export,
+    }
+
+
+def run_size(size, repeat, export_repeat, import_rows, workdir, results):
+    """Seed one catalog and run every scenario against it (runs in a child process)."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, f'catalog_{size}.db')
+    os.environ['SQLITE_PROFILE'] = '1'
+    import logging
+    from app import create_app
+    app = create_app('production')
+    logging.getLogger().setLevel(logging.WARNING)
+    app.config.update(MAX_CONTENT_LENGTH=None, CATALOG_ETAGS=False)
+    rng = random.Random(size)
+
+    t0 = time.perf_counter()
+    with app.app_context():
+        seed(size, rng)
+    seed_s = time.perf_counter() - t0
+    # the seed bypasses the write path, so sign it the way an existing catalog is backfilled
+    t0 = time.perf_counter()
+    with app.app_context():
+        from dedup import refresh_signatures
+        refresh_signatures()
+    sign_s = time.perf_counter() - t0
+
+    client = app.test_client()
+    out = {'size': size, 'seed_s': round(seed_s, 2), 'seed_rows_per_s': round(size / seed_s, 1),
+           'signature_backfill_s': round(sign_s, 2), 'scenarios': {}}
+    for name, call in scenarios(client, size).items():
+        out['scenarios'][name] = run_scenario(call, export_repeat if name.endswith('_export') else repeat)
+
+    # each import call adds new rows, so give every call its own slice of ids
+    next_id = [size + 1_000_000]
+
+    def importer(url):
+        def do_import():
+            payload = import_csv(next_id[0], import_rows, rng)
+            next_id[0] += import_rows
+            resp = client.post(url, data={'file': (io.BytesIO(payload), 'bench.csv')},
+                               content_type='multipart/form-data')
+            data = resp.get_json()
+            assert resp.status_code == 200 and data['imported'] == import_rows, data
+            return data['imported']
+        return do_import
+    out['scenarios']['records_import'] = run_scenario(importer('/records/import'), export_repeat)
+    out['scenarios']['records_import_fuzzy'] = run_scenario(importer('/records/import?fuzzy=1'), export_repeat)
+
+    try:
+        import resource
+        out['peak_rss_mib'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        out['peak_rss_mib'] = None
+    results.put(out)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000', help='comma-separated catalog sizes, e.g. 10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per read scenario')
+    parser.add_argument('--export-repeat', type=int, default=3, help='timed calls for CSV/XLSX export and import')
+    parser.add_argument('--import-rows', type=int, default=5000, help='rows per timed import')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    report = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': [],
+    }
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='bench_endpoints_') as workdir:
+        for size in sizes:
+            results = ctx.Queue()
+            proc = ctx.Process(target=run_size, args=(size, args.repeat, args.export_repeat,
+                                                      args.import_rows, workdir, results))
+            proc.start()
+            result = results.get()
+            proc.join()
+            report['results'].append(result)
+            print(f"size {size}: done", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: per-row val_for() conversion vs. the compiled ImportSchema.
+
+Only the row -> column-values conversion is timed (no database work).
+
+    python benchmarks/import_schema.py [rows]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importer import ImportSchema, map_headers  # noqa: E402
+
+HEADER = ['description', 'group', 'mrp', 'size', 'main', 'alt', 'qty',
+          'purchase', 'bulk sp1', 'bulk sp2', 'sale', 'supplier']
+# a supplier file with only some of the columns
+SHORT_HEADER = ['description', 'mrp', 'sale']
+
+
+def synthetic_rows(n):
+    return [
+        [f"SOAP {i} 100G (HYGIENE) 45/-", 'HYGIENE', '45', '1CTN=20PKD', 'CTN', 'PKD',
+         '20', '30.50', '38', '37.5', '40', 'ACME TRADERS']
+        for i in range(n)
+    ]
+
+
+def legacy_convert(header, rows):
+    """The per-row conversion import_items() used before ImportSchema."""
+    header_to_field = map_headers(header)
+    out = []
+    for raw in rows:
+        r = {header[i]: (raw[i] if i < len(raw) else None) for i in range(len(header))}
+
+        def val_for(field):
+            for h, f in header_to_field.items():
+                if f == field:
+                    return r.get(h)
+            return r.get(field)
+
+        def num(x):
+            if x is None or str(x).strip() == '':
+                return None
+            try:
+                return float(str(x).replace(',', '').strip())
+            except Exception:
+                return None
+
+        out.append(dict(
+            description=str(val_for('description') or '').strip(),
+            item_group=val_for('item_group') or '',
+            mrp=(lambda v: (int(v) if str(v).strip().isdigit() else float(v)) if v is not None and str(v).strip() != '' else None)(val_for('mrp')) if val_for('mrp') is not None else None,
+            item_size=(val_for('item_size') or ''),
+            main_unit=(val_for('main_unit') or ''),
+            alt_unit=(val_for('alt_unit') or ''),
+            alt_qty=(int(num(val_for('alt_qty'))) if num(val_for('alt_qty')) is not None else None),
+            purc_price=(num(val_for('purc_price')) if val_for('purc_price') is not None else None),
+            bulk_sp1=(num(val_for('bulk_sp1')) if val_for('bulk_sp1') is not None else None),
+            bulk_sp2=(num(val_for('bulk_sp2')) if val_for('bulk_sp2') is not None else None),
+            sale_price=(num(val_for('sale_price')) if val_for('sale_price') is not None else None),
+            supplier=(val_for('supplier') or '')
+        ))
+    return out
+
+
+def compiled_convert(header, rows, batch_size=1000):
+    schema = ImportSchema(header)
+    out = []
+    for start in range(0, len(rows), batch_size):
+        descriptions, values, _ = schema.convert(rows[start:start + batch_size])
+        for desc, v in zip(descriptions, values):
+            v['description'] = str(desc or '').strip()
+            out.append(v)
+    return out
+
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rows = synthetic_rows(n)
+    assert legacy_convert(HEADER, rows[:50]) == compiled_convert(HEADER, rows[:50])
+    short = [[r[0], r[2], r[10]] for r in rows[:50]]
+    assert legacy_convert(SHORT_HEADER, short) == compiled_convert(SHORT_HEADER, short)
+
+    legacy = best_of(lambda: legacy_convert(HEADER, rows))
+    compiled = best_of(lambda: compiled_convert(HEADER, rows))
+    print(f"rows: {n}")
+    print(f"legacy val_for path : {legacy:.3f}s ({n / legacy:,.0f} rows/s)")
+    print(f"compiled schema     : {compiled:.3f}s ({n / compiled:,.0f} rows/s)")
+    print(f"speedup             : {legacy / compiled:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: what keeping the derived tables current costs a bulk insert.
+
+The same synthetic rows are inserted in executemany batches (one commit each,
+like BulkItemWriter) into a fresh SQLite catalog per mode:
+- bare:     item triggers dropped; nothing derived is maintained (the floor)
+- per-row:  every AFTER INSERT trigger (FTS, group catalog, catalog version,
+            summaries, change log) fires for every row
+- deferred: inside schema.deferred_insert_triggers(), the path imports and
+            batch create use; one set-based statement per derived table per batch,
+            plus the near-duplicate signatures of the new rows
+
+    python benchmarks/import_triggers.py [rows] [batch_size]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('bare', 'per-row', 'deferred')
+
+
+def run_mode(mode, rows, batch_size, workdir, results):
+    """Insert `rows` items into a fresh catalog (runs in a child process)."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, f'{mode}.db')
+    os.environ['SQLITE_PROFILE'] = '1'
+    import logging
+    from contextlib import nullcontext
+    from sqlalchemy import text
+    from app import create_app
+    from extensions import db
+    from models import Item, normalize_description
+    from schema import deferred_insert_triggers
+    from endpoints import synthetic_item
+
+    app = create_app('production')
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(1)
+    with app.app_context():
+        if mode == 'bare':
+            with db.engine.begin() as conn:
+                names = conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'item'")).scalars().all()
+                for name in names:
+                    conn.execute(text(f"DROP TRIGGER {name}"))
+        stmt = Item.__table__.insert()
+        elapsed = 0.0
+        for start in range(0, rows, batch_size):
+            batch = []
+            for i in range(start, min(rows, start + batch_size)):
+                row = synthetic_item(i, rng)
+                row['description_key'] = normalize_description(row['description'])
+                batch.append(row)
+            t0 = time.perf_counter()
+            with deferred_insert_triggers(db.session) if mode == 'deferred' else nullcontext():
+                db.session.execute(stmt, batch)
+            db.session.commit()
+            elapsed += time.perf_counter() - t0
+    results.put((mode, elapsed))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    ctx = multiprocessing.get_context('spawn')
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix='bench_triggers_') as workdir:
+        for mode in MODES:
+            results = ctx.Queue()
+            proc = ctx.Process(target=run_mode, args=(mode, rows, batch_size, workdir, results))
+            proc.start()
+            name, elapsed = results.get()
+            proc.join()
+            timings[name] = elapsed
+    print(f"rows: {rows}, batch size: {batch_size}")
+    for mode in MODES:
+        print(f"{mode:<9}: {timings[mode]:.3f}s ({rows / timings[mode]:,.0f} rows/s, "
+              f"{timings[mode] / timings['bare']:.2f}x bare)")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark: /api/records page serialization, ORM + per-row dict builder
+vs. the column-projected rows_to_dicts() path.
+
+Runs against an in-memory catalog; times building one 200-row JSON page and
+measures peak traced memory for it.
+
+    python benchmarks/serialization.py [repeat]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify  # noqa: E402
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Item  # noqa: E402
+from serializers import project, rows_to_dicts, json_response, to_ist  # noqa: E402
+
+PER_PAGE = 200
+
+
+def seed(n=2000):
+    base = datetime(2024, 1, 1)
+    db.session.execute(Item.__table__.insert(), [
+        dict(description=f"SOAP {i} 100G (HYGIENE) 45/-", description_key=f"soap {i} 100g (hygiene) 45/-",
+             item_group='HYGIENE', mrp=45, item_size='1CTN=20PKD', main_unit='CTN', alt_unit='PKD',
+             alt_qty=20, purc_price=30.5, bulk_sp1=38.0, bulk_sp2=37.5, sale_price=40.0,
+             supplier='ACME TRADERS', last_updated=base + timedelta(minutes=i // 50))
+        for i in range(n)
+    ])
+    db.session.commit()
+
+
+def legacy_page():
+    """The ORM-hydrating row_to_dict path /api/records used before serializers.py."""
+    items = Item.query.order_by(Item.id.desc()).limit(PER_PAGE).all()
+
+    def row_to_dict(it):
+        last = getattr(it, 'last_updated', None)
+        last_s = None
+        if last:
+            try:
+                last_s = to_ist(last).isoformat(sep=' ')
+            except Exception:
+                last_s = last.isoformat(sep=' ')
+        return {
+            "id": it.id, "description": it.description, "item_group": it.item_group,
+            "mrp": it.mrp, "item_size": it.item_size, "main_unit": it.main_unit,
+            "alt_unit": it.alt_unit, "alt_qty": it.alt_qty, "purc_price": it.purc_price,
+            "bulk_sp1": it.bulk_sp1, "bulk_sp2": it.bulk_sp2, "sale_price": it.sale_price,
+            "supplier": it.supplier, "last_updated": last_s
+        }
+
+    resp = jsonify({"items": [row_to_dict(it) for it in items]})
+    db.session.expunge_all()
+    return resp
+
+
+def projected_page():
+    rows = project(Item.query.order_by(Item.id.desc())).limit(PER_PAGE).all()
+    return json_response({"items": rows_to_dicts(rows)})
+
+
+def measure(fn, repeat):
+    fn()  # warm up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_call = (time.perf_counter() - t0) / repeat
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call, peak
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    app = create_app('testing')
+    with app.test_request_context('/api/records'):
+        seed()
+        legacy_t, legacy_mem = measure(legacy_page, repeat)
+        new_t, new_mem = measure(projected_page, repeat)
+    print(f"per_page: {PER_PAGE}, repeat: {repeat}")
+    print(f"legacy ORM + row_to_dict : {legacy_t * 1000:.2f} ms/page, peak {legacy_mem / 1024:.0f} KiB")
+    print(f"projected rows_to_dicts  : {new_t * 1000:.2f} ms/page, peak {new_mem / 1024:.0f} KiB")
+    print(f"speedup                  : {legacy_t / new_t:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Concurrency check for the SQLite production profile: readers must not block
+while a large import is running, and concurrent saves must not fail with
+"database is locked".
+
+Runs a synchronous /records/import of a generated CSV while reader processes
+(each its own app, like separate gunicorn workers) poll /api/records and
+/api/analytics and a writer process adds single items through
+/api/items/batch. Prints read latency percentiles and
+error counts; exits non-zero if any request failed or a read took longer than
+--max-read-ms.
+
+    python benchmarks/sqlite_concurrency.py [--rows 50000] [--readers 4] [--no-profile]
+
+--no-profile runs the same load with the default rollback-journal settings
+for comparison.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import multiprocessing
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+READ_URLS = ('/api/records?per_page=20', '/api/analytics')
+
+
+def make_csv(rows):
+    out = io.StringIO()
+    out.write("description,group,supplier,purc_price,sale_price,mrp\n")
+    for i in range(rows):
+        out.write(f"BULK ITEM {i},GROUP {i % 40},SUPPLIER {i % 25},{10 + i % 90},{12 + i % 95},{20 + i % 100}\n")
+    return out.getvalue().encode('utf-8')
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def reader(n, done, results):
+    """One reader process (a separate app, like a gunicorn worker)."""
+    from app import create_app
+    client = create_app('production').test_client()
+    latencies, errors, i = [], [], 0
+    while not done.is_set():
+        url = READ_URLS[(n + i) % len(READ_URLS)]
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if resp.status_code != 200:
+            errors.append(f"{url}: {resp.status_code}")
+        i += 1
+    results.put(('read', latencies, errors))
+
+
+def writer(done, results):
+    """Single-item saves from another process while the import runs."""
+    from app import create_app
+    client = create_app('production').test_client()
+    ok, errors, i = 0, [], 0
+    while not done.is_set():
+        resp = client.post('/api/items/batch', json={'items': [
+            {'description': f'CONCURRENT SAVE {i}', 'item_group': 'LIVE', 'purc_price': 5, 'sale_price': 6}]})
+        if resp.status_code == 201:
+            ok += 1
+        else:
+            errors.append(str((resp.get_json() or {}).get('message', resp.status_code)))
+        i += 1
+        time.sleep(0.02)
+    results.put(('write', ok, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--max-read-ms', type=float, default=1000.0)
+    parser.add_argument('--no-profile', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='sqlite_concurrency_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['SQLITE_PROFILE'] = '0' if args.no_profile else '1'
+
+    from app import create_app
+    app = create_app('production')
+    app.config['MAX_CONTENT_LENGTH'] = None
+    payload = make_csv(args.rows)
+
+    ctx = multiprocessing.get_context('spawn')
+    done, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=reader, args=(n, done, results)) for n in range(args.readers)]
+    procs.append(ctx.Process(target=writer, args=(done, results)))
+    for p in procs:
+        p.start()
+    time.sleep(2)  # let the workers start up and begin polling
+
+    client = app.test_client()
+    t0 = time.perf_counter()
+    resp = client.post('/records/import', data={'file': (io.BytesIO(payload), 'bulk.csv')},
+                       content_type='multipart/form-data')
+    import_result = dict(resp.get_json() or {}, status_code=resp.status_code,
+                         seconds=round(time.perf_counter() - t0, 2))
+    done.set()
+
+    read_ms, read_errors, write_ok, write_errors = [], [], 0, []
+    for _ in procs:
+        kind, first, errors = results.get()
+        if kind == 'read':
+            read_ms += first
+            read_errors += errors
+        else:
+            write_ok += first
+            write_errors += errors
+    for p in procs:
+        p.join()
+
+    report = {
+        'profile': not args.no_profile,
+        'rows': args.rows,
+        'import': {k: import_result.get(k) for k in ('status_code', 'imported', 'skipped', 'seconds')},
+        'reads': len(read_ms),
+        'read_ms': {
+            'p50': round(percentile(read_ms, 50) or 0, 1),
+            'p95': round(percentile(read_ms, 95) or 0, 1),
+            'p99': round(percentile(read_ms, 99) or 0, 1),
+            'max': round(max(read_ms, default=0), 1),
+        },
+        'read_errors': len(read_errors),
+        'writes': write_ok,
+        'write_errors': len(write_errors),
+        'first_write_error': write_errors[0] if write_errors else None,
+    }
+    print(json.dumps(report, indent=2))
+    failed = read_errors or write_errors or report['read_ms']['max'] > args.max_read_ms \
+        or import_result.get('status_code') != 200
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
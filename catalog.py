@@ -0,0 +1,162 @@
+"""
+Catalog metadata maintained alongside the item table.
+
+Group catalog: on SQLite the `item_group_catalog` table is maintained by
+triggers on `item`, so every write path (ORM saves, bulk Core inserts,
+deletes) keeps it current and rendering the group filter is a read of a few
+rows rather than a DISTINCT scan of the item table. Other databases fall back
+to GROUP BY.
+
+Catalog version: a one-row counter in `catalog_version`, bumped by triggers on
+every item insert/update/delete. Read endpoints derive ETags from it so an
+unchanged catalog can be answered with 304 without running the query. The
+same row's `descriptions` counter only moves on inserts, deletes and updates
+that change a description, so the typeahead index ignores price edits.
+"""
+from sqlalchemy import func, text
+from extensions import db
+from models import Item, GroupCatalog, CatalogVersion, ROW_TRIGGERS_ACTIVE
+
+
+_HAS_GROUP = "{row}.item_group IS NOT NULL AND trim({row}.item_group) != ''"
+_INCREMENT = """INSERT INTO item_group_catalog (item_group, item_count) VALUES (new.item_group, 1)
+        ON CONFLICT(item_group) DO UPDATE SET item_count = item_count + 1;"""
+_DECREMENT = """UPDATE item_group_catalog SET item_count = item_count - 1 WHERE item_group = old.item_group;
+        DELETE FROM item_group_catalog WHERE item_group = old.item_group AND item_count <= 0;"""
+
+CATALOG_TRIGGERS = {
+    'item_group_catalog_ai': f"""CREATE TRIGGER IF NOT EXISTS item_group_catalog_ai AFTER INSERT ON item
+        WHEN {ROW_TRIGGERS_ACTIVE} AND {_HAS_GROUP.format(row='new')} BEGIN
+        {_INCREMENT}
+    END""",
+    'item_group_catalog_ad': f"""CREATE TRIGGER IF NOT EXISTS item_group_catalog_ad AFTER DELETE ON item
+        WHEN {_HAS_GROUP.format(row='old')} BEGIN
+        {_DECREMENT}
+    END""",
+    'item_group_catalog_au_old': f"""CREATE TRIGGER IF NOT EXISTS item_group_catalog_au_old AFTER UPDATE OF item_group ON item
+        WHEN old.item_group IS NOT new.item_group AND {_HAS_GROUP.format(row='old')} BEGIN
+        {_DECREMENT}
+    END""",
+    'item_group_catalog_au_new': f"""CREATE TRIGGER IF NOT EXISTS item_group_catalog_au_new AFTER UPDATE OF item_group ON item
+        WHEN old.item_group IS NOT new.item_group AND {_HAS_GROUP.format(row='new')} BEGIN
+        {_INCREMENT}
+    END""",
+}
+
+# a deferred bulk insert counts its rows per group in one statement
+GROUP_CATALOG_BATCH_SQL = [
+    f"""INSERT INTO item_group_catalog (item_group, item_count)
+        SELECT item_group, count(*) FROM item
+        WHERE id > :after AND {_HAS_GROUP.format(row='item')} GROUP BY item_group
+        ON CONFLICT(item_group) DO UPDATE SET item_count = item_count + excluded.item_count""",
+]
+
+# engine -> bool, resolved once per engine
+_catalog_state = {}
+
+
+def _has_triggers(conn):
+    names = {r[0] for r in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'item_group_catalog_%'"))}
+    return set(CATALOG_TRIGGERS) <= names
+
+
+def install_group_catalog(conn):
+    """Create the maintenance triggers (SQLite only); rebuild counts on first install."""
+    if conn.dialect.name != 'sqlite':
+        return False
+    fresh = not _has_triggers(conn)
+    for ddl in CATALOG_TRIGGERS.values():
+        conn.execute(text(ddl))
+    if fresh:
+        rebuild_group_catalog(conn)
+    return True
+
+
+def rebuild_group_catalog(conn):
+    """Recompute every group count from the item table."""
+    conn.execute(text("DELETE FROM item_group_catalog"))
+    conn.execute(text(
+        "INSERT INTO item_group_catalog (item_group, item_count) "
+        "SELECT item_group, count(*) FROM item "
+        f"WHERE {_HAS_GROUP.format(row='item')} GROUP BY item_group"))
+
+
+def catalog_enabled():
+    engine = db.engine
+    if engine not in _catalog_state:
+        enabled = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                enabled = _has_triggers(conn)
+        _catalog_state[engine] = enabled
+    return _catalog_state[engine]
+
+
+def group_counts():
+    """[(group, item_count), ...] ordered by group name."""
+    if catalog_enabled():
+        rows = db.session.query(GroupCatalog.item_group, GroupCatalog.item_count) \
+            .order_by(GroupCatalog.item_group).all()
+    else:
+        rows = db.session.query(Item.item_group, func.count(Item.id)) \
+            .filter(Item.item_group.isnot(None)).group_by(Item.item_group) \
+            .order_by(Item.item_group).all()
+    return [(g, n) for g, n in rows if g is not None and str(g).strip() != ""]
+
+
+_DESCRIPTION_CHANGED = "(old.description_key IS NOT new.description_key OR old.description IS NOT new.description)"
+
+VERSION_TRIGGERS = {
+    f'catalog_version_{event.lower()}': f"""CREATE TRIGGER IF NOT EXISTS catalog_version_{event.lower()} AFTER {event} ON item{when} BEGIN
+        UPDATE catalog_version SET version = version + 1, descriptions = descriptions + {bump} WHERE id = 1;
+    END"""
+    for event, when, bump in (
+        ('INSERT', f' WHEN {ROW_TRIGGERS_ACTIVE}', '1'),
+        ('UPDATE', '', _DESCRIPTION_CHANGED),
+        ('DELETE', '', '1'),
+    )
+}
+
+# a deferred bulk insert moves both counters once
+VERSION_BATCH_SQL = ["UPDATE catalog_version SET version = version + 1, descriptions = descriptions + 1 WHERE id = 1"]
+
+# engine -> bool, resolved once per engine
+_version_state = {}
+
+
+def install_catalog_version(conn):
+    """Seed the counter row and create the bump triggers (SQLite only)."""
+    if conn.dialect.name != 'sqlite':
+        return False
+    conn.execute(text("INSERT OR IGNORE INTO catalog_version (id, version, descriptions) VALUES (1, 0, 0)"))
+    for ddl in VERSION_TRIGGERS.values():
+        conn.execute(text(ddl))
+    return True
+
+
+def version_enabled():
+    engine = db.engine
+    if engine not in _version_state:
+        enabled = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                names = {r[0] for r in conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'catalog_version_%'"))}
+                enabled = set(VERSION_TRIGGERS) <= names
+        _version_state[engine] = enabled
+    return _version_state[engine]
+
+
+def catalog_version():
+    """Current change counter, or None when it isn't maintained on this database."""
+    if not version_enabled():
+        return None
+    return db.session.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar()
+
+
+def description_version():
+    """Counter that only moves when a description is added, removed or edited; None if not maintained."""
+    if not version_enabled():
+        return None
+    return db.session.query(CatalogVersion.descriptions).filter(CatalogVersion.id == 1).scalar()
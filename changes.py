@@ -0,0 +1,203 @@
+"""
+Change log for delta sync.
+
+On SQLite, triggers on `item` append one `item_change` row per insert or
+update ('U') and per delete ('D', a tombstone). `seq` is an AUTOINCREMENT key,
+so it only grows and serves as the client's sync token: /api/changes?since=<seq>
+returns the items upserted and the ids deleted after it, a page at a time.
+
+The log is compacted by `flask compact-changes`, and after bulk writes
+(imports, batch API) once CHANGES_COMPACT_INTERVAL has passed; reads never
+write to it. Compaction drops rows superseded by a later change to the
+same item (a client only needs the latest state) and purges tombstones
+older than CHANGES_TOMBSTONE_DAYS. The highest purged seq is kept
+as the horizon and every purge starts a new epoch. Tokens are "<epoch>-<seq>":
+a token from an earlier epoch whose seq is below the horizon may have missed a
+delete, so that client has to resync from since=0. A full sync (since=0) is
+served by the same log, which holds at least one row for every live item.
+"""
+import time
+from flask import current_app
+from sqlalchemy import func, select, text
+from extensions import db
+from models import AppMeta, Item, ItemChange, ROW_TRIGGERS_ACTIVE
+
+HORIZON_KEY = 'changes_horizon'
+EPOCH_KEY = 'changes_epoch'
+COMPACTED_KEY = 'changes_compacted_at'
+
+CHANGE_TRIGGERS = {
+    'item_change_ai': f"""CREATE TRIGGER IF NOT EXISTS item_change_ai AFTER INSERT ON item WHEN {ROW_TRIGGERS_ACTIVE} BEGIN
+        INSERT INTO item_change (item_id, op, changed_at) VALUES (new.id, 'U', CURRENT_TIMESTAMP);
+    END""",
+    'item_change_au': """CREATE TRIGGER IF NOT EXISTS item_change_au AFTER UPDATE ON item BEGIN
+        INSERT INTO item_change (item_id, op, changed_at) VALUES (new.id, 'U', CURRENT_TIMESTAMP);
+    END""",
+    'item_change_ad': """CREATE TRIGGER IF NOT EXISTS item_change_ad AFTER DELETE ON item BEGIN
+        INSERT INTO item_change (item_id, op, changed_at) VALUES (old.id, 'D', CURRENT_TIMESTAMP);
+    END""",
+}
+
+
+# a deferred bulk insert logs its rows in one statement
+CHANGE_BATCH_SQL = [
+    """INSERT INTO item_change (item_id, op, changed_at)
+        SELECT id, 'U', CURRENT_TIMESTAMP FROM item WHERE id > :after ORDER BY id""",
+]
+
+
+class TokenExpired(Exception):
+    """Raised when a sync token is older than the tombstone horizon."""
+
+
+# engine -> bool, resolved once per engine
+_changes_state = {}
+# engine -> monotonic time of the last compaction check in this process
+_compact_checked = {}
+
+
+def _has_triggers(conn):
+    names = {r[0] for r in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'item_change_%'"))}
+    return set(CHANGE_TRIGGERS) <= names
+
+
+def install_change_log(conn):
+    """Create the log triggers (SQLite only); on first install log every existing item once."""
+    if conn.dialect.name != 'sqlite':
+        return False
+    fresh = not _has_triggers(conn)
+    for ddl in CHANGE_TRIGGERS.values():
+        conn.execute(text(ddl))
+    if fresh:
+        conn.execute(text(
+            "INSERT INTO item_change (item_id, op, changed_at) "
+            "SELECT id, 'U', CURRENT_TIMESTAMP FROM item ORDER BY id"))
+    return True
+
+
+def changes_enabled():
+    engine = db.engine
+    if engine not in _changes_state:
+        enabled = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                enabled = _has_triggers(conn)
+        _changes_state[engine] = enabled
+    return _changes_state[engine]
+
+
+def _meta(key):
+    return db.session.execute(select(AppMeta.value).where(AppMeta.key == key)).scalar()
+
+
+def horizon():
+    """(epoch, highest purged seq); (0, 0) until tombstones have been purged."""
+    return int(_meta(EPOCH_KEY) or 0), int(_meta(HORIZON_KEY) or 0)
+
+
+def format_token(epoch, seq):
+    return f"{epoch}-{seq}"
+
+
+def parse_token(token):
+    """(epoch, seq) of a token; "0" (or nothing) is a full sync. ValueError for anything else."""
+    token = (token or '').strip()
+    if token in ('', '0'):
+        return 0, 0
+    epoch, sep, seq = token.partition('-')
+    if not (sep and epoch.isdigit() and seq.isdigit()):
+        raise ValueError(f"Invalid sync token: {token!r}")
+    return int(epoch), int(seq)
+
+
+def compact_changes(tombstone_days=30):
+    """
+    Drop superseded log rows and tombstones older than `tombstone_days`;
+    returns {"superseded": n, "tombstones": n, "horizon": seq}.
+    """
+    table = ItemChange.__table__
+    latest = select(func.max(table.c.seq)).group_by(table.c.item_id)
+    superseded = db.session.execute(table.delete().where(table.c.seq.not_in(latest))).rowcount
+
+    cutoff = text(f"datetime('now', '-{int(tombstone_days)} days')")
+    expired = (table.c.op == 'D') & (table.c.changed_at <= cutoff)
+    purged_to = db.session.execute(select(func.max(table.c.seq)).where(expired)).scalar()
+    tombstones = 0
+    epoch, new_horizon = horizon()
+    if purged_to is not None:
+        tombstones = db.session.execute(table.delete().where(expired)).rowcount
+        new_horizon = max(new_horizon, purged_to)
+        db.session.merge(AppMeta(key=HORIZON_KEY, value=str(new_horizon)))
+        db.session.merge(AppMeta(key=EPOCH_KEY, value=str(epoch + 1)))
+    db.session.merge(AppMeta(key=COMPACTED_KEY, value=str(int(time.time()))))
+    db.session.commit()
+    return {"superseded": superseded, "tombstones": tombstones, "horizon": new_horizon}
+
+
+def compact_if_due(interval, tombstone_days):
+    """Run compact_changes() when the last run (any process) is older than `interval` seconds."""
+    engine = db.engine
+    now = time.monotonic()
+    if now - _compact_checked.get(engine, float('-inf')) < min(interval, 60):
+        return None
+    _compact_checked[engine] = now
+    last = int(_meta(COMPACTED_KEY) or 0)
+    if time.time() - last < interval:
+        return None
+    return compact_changes(tombstone_days)
+
+
+def compact_after_write():
+    """
+    compact_if_due() with the app's CHANGES_* settings, for write paths to call
+    once their own transaction has committed. A failed compaction is logged,
+    not raised: the write it follows has already succeeded.
+    """
+    config = current_app.config
+    interval = config.get('CHANGES_COMPACT_INTERVAL', 3600)
+    if not interval or not changes_enabled():
+        return None
+    try:
+        return compact_if_due(interval, config.get('CHANGES_TOMBSTONE_DAYS', 30))
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Change-log compaction failed")
+        return None
+
+
+def changes_since(token, limit=1000):
+    """
+    The next page of changes after `token`.
+
+    Returns (upsert_rows, deleted_ids, next_token, has_more): upsert_rows are
+    projected Item rows in their current state, deleted_ids the tombstoned
+    ids. Raises ValueError for a malformed token and TokenExpired when
+    tombstones after it were purged since it was issued.
+    """
+    token_epoch, since = parse_token(token)
+    epoch, purged_to = horizon()
+    if since and token_epoch < epoch and since < purged_to:
+        raise TokenExpired(f"Token {token} is older than the change log; resync with since=0.")
+    rows = db.session.execute(
+        select(ItemChange.seq, ItemChange.item_id, ItemChange.op)
+        .where(ItemChange.seq > since).order_by(ItemChange.seq).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], [], format_token(epoch, since), False
+
+    # latest operation per item within the page
+    latest = {}
+    for _, item_id, op in rows:
+        latest[item_id] = op
+    upsert_ids = [i for i, op in latest.items() if op == 'U']
+    deleted = sorted(i for i, op in latest.items() if op == 'D')
+
+    from serializers import project
+    upserts = []
+    for start in range(0, len(upsert_ids), 500):
+        part = upsert_ids[start:start + 500]
+        # an id missing here was deleted after this page; its tombstone comes later
+        upserts += project(Item.query.filter(Item.id.in_(part)).order_by(Item.id)).all()
+    return upserts, deleted, format_token(epoch, rows[-1].seq), has_more
@@ -11,6 +11,33 @@ class Config:
         'pool_recycle': 300,
     }
 
+    # SQLite production profile (see sqlite_profile.py); file-backed SQLite only
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', '0') == '1'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers don't block on the writer
+        'synchronous': 'NORMAL',  # safe with WAL; fsync at checkpoints
+        'cache_size': -32000,  # KiB per connection
+        'mmap_size': 268435456,
+        'busy_timeout': 10000,  # ms to wait for another process's write lock
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_WRITE_TIMEOUT = 30  # seconds a writer waits for the write connection
+
+    # Startup configuration (see startup.py)
+    SCHEMA_CHECK = os.environ.get('SCHEMA_CHECK', 'fingerprint')  # or 'always' to run create_all + upgrades every start
+    STARTUP_PREWARM = os.environ.get('STARTUP_PREWARM', '0') == '1'  # render the first pages once before serving
+
+    # Instrumentation (see metrics.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'  # Server-Timing header + /metrics
+    HEALTH_MAX_DB_LATENCY_MS = 250  # /health reports 'degraded' above this
+
+    # Slow-query log (see slow_queries.py)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))  # 0 disables; DevelopmentConfig defaults to 100
+    SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', '0') == '1'  # bound values hold customer data
+    SLOW_QUERY_EXPLAIN = True  # capture EXPLAIN QUERY PLAN (SQLite)
+    SLOW_QUERY_LOG_SIZE = 200  # recent entries kept in memory
+    SLOW_QUERY_REPORT = os.environ.get('SLOW_QUERY_REPORT', '0') == '1'  # /_debug/slow-queries outside debug mode
+
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -21,20 +48,60 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_EXTENSIONS = {'.csv', '.xlsx', '.xls', '.xlsm'}
 
+    # Import configuration
+    IMPORT_BATCH_SIZE = 1000  # rows per INSERT/commit
+    IMPORT_USE_SAVEPOINTS = False  # retry a failed batch row by row to keep the good rows
+    IMPORT_WORKERS = 2  # background import threads (async=1 uploads)
+    IMPORT_MAX_PENDING_JOBS = 4  # queued + running jobs before new ones are refused
+    IMPORT_JOB_TTL = 3600  # seconds a job's status is kept for polling before it is pruned
+    IMPORT_JOB_PUBLISH_SECONDS = 1.0  # how often a running job writes its progress for other workers
+    IMPORT_JOB_STALE_INTERVALS = 10  # missed publishes before an unfinished job counts as failed (its worker died)
+    IMPORT_SPOOL_DIR = os.environ.get('IMPORT_SPOOL_DIR')  # defaults to the system temp dir
+    IMPORT_FUZZY_DEDUP = False  # flag near-duplicate rows on every import (or pass fuzzy=1)
+    IMPORT_FUZZY_THRESHOLD = 0.8  # trigram Jaccard similarity that counts as a probable duplicate
+    IMPORT_FUZZY_MAX_REPORTED = 200  # near-duplicate rows listed in the response (all are counted)
+
     # Pagination defaults
     ITEMS_PER_PAGE = 12
     MAX_ITEMS_PER_PAGE = 200
+    RECORDS_COUNT_CACHE_TTL = 30  # seconds a cursor-mode total count is reused (until the catalog version moves)
+    CATALOG_ETAGS = True  # ETag + If-None-Match (304) on the read API and CSV export
+
+    # Batch API configuration
+    BATCH_MAX_ITEMS = 1000  # entries per /api/items/batch request
+
+    # Search configuration
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')  # 'auto' (FTS5 when available) or 'like'
+
+    # Add-form typeahead (/api/suggest)
+    SUGGEST_LIMIT = 8  # suggestions returned by default
+    SUGGEST_MAX_LIMIT = 25
+    SUGGEST_RECHECK_SECONDS = 2.0  # how often the catalog version is compared with the index
+    SUGGEST_MAX_AGE = 60  # rebuild interval when there is no catalog version (non-SQLite)
+
+    # Delta sync (/api/changes)
+    CHANGES_PAGE_SIZE = 1000  # changes read per response by default
+    CHANGES_MAX_PAGE_SIZE = 5000
+    CHANGES_TOMBSTONE_DAYS = 30  # deletes older than this are compacted away; older tokens must resync
+    CHANGES_COMPACT_INTERVAL = 3600  # seconds between compactions run after imports / batch writes (0: only flask compact-changes)
+
+    # Export configuration
+    EXPORT_CHUNK_SIZE = 500  # rows fetched per round trip when streaming exports
+    EXPORT_SPOOL_DIR = os.environ.get('EXPORT_SPOOL_DIR')  # where XLSX exports are built; system temp dir by default
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     TESTING = False
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', '1') == '1'
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
     SESSION_COOKIE_SECURE = True  # Require HTTPS in production
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', '1') == '1'
 
 class TestingConfig(Config):
     """Testing configuration"""
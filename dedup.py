@@ -0,0 +1,310 @@
+"""
+Near-duplicate detection for imports.
+
+The exact duplicate check only catches descriptions that normalize to the same
+key, so supplier variants like "SOAP 100 G" / "SOAP 100G" or a dropped letter
+slip through. Here each description is reduced to its character trigrams
+(case-folded, punctuation and spaces removed) and summarized by a 16-value
+MinHash signature (one-permutation hashing with rotation densification: one
+hash per trigram instead of one per trigram per permutation). The signature is
+cut into 4 bands of 4 values; two descriptions become candidates when any band
+matches (LSH), and candidates are confirmed with the exact trigram Jaccard
+similarity. Comparing a file against the catalog therefore costs a few index
+lookups per row instead of a scan of every item.
+
+Catalog signatures live in `item_signature` (one row per item, band keys
+indexed) and are kept current on the write path: bulk inserts (imports, batch
+create) sign their new rows as part of the batch, and ORM flushes (add form,
+batch PATCH) re-sign items whose description key changed. Hashing costs about
+30 µs per description, so it stays out of the fuzzy-import request; catalogs
+that predate this are backfilled once with `flask refresh-signatures`. On
+SQLite a trigger drops an item's signature when the item is deleted.
+"""
+import re
+import struct
+import zlib
+from hashlib import blake2b
+from sqlalchemy import and_, delete, event, func, inspect, insert, or_, select, text
+from extensions import db
+from models import Item, ItemSignature, normalize_description
+from sqlite_profile import RoutingSession
+
+NGRAM = 3
+LSH_BANDS = 4
+LSH_ROWS = 4
+_BINS = LSH_BANDS * LSH_ROWS  # power of two: bin = hash & (_BINS - 1)
+_BIN_SHIFT = _BINS.bit_length() - 1
+_ROTATION = 1 << (32 - _BIN_SHIFT)  # offset that marks a borrowed (densified) bin
+_COMPACT_RE = re.compile(r'[\W_]+')
+_BAND_COLUMNS = [ItemSignature.__table__.c[f'band{i}'] for i in range(LSH_BANDS)]
+LOOKUP_CHUNK = 500  # band keys / item ids per candidate query
+
+SIGNATURE_TRIGGERS = {
+    'item_signature_ad': """CREATE TRIGGER IF NOT EXISTS item_signature_ad AFTER DELETE ON item BEGIN
+        DELETE FROM item_signature WHERE item_id = old.id;
+    END""",
+}
+
+
+def ngrams(description):
+    """Character trigrams of the compacted, case-folded description."""
+    s = _COMPACT_RE.sub('', normalize_description(description))
+    if len(s) <= NGRAM:
+        return {s} if s else set()
+    return {s[i:i + NGRAM] for i in range(len(s) - NGRAM + 1)}
+
+
+def similarity(a, b, at_least=0.0):
+    """Jaccard similarity of two trigram sets; 0.0 early when the sizes alone rule out `at_least`."""
+    la, lb = len(a), len(b)
+    if not la or not lb or min(la, lb) < at_least * max(la, lb):
+        return 0.0
+    shared = len(a & b)
+    return shared / (la + lb - shared)
+
+
+def signature(grams):
+    """One-permutation MinHash of a trigram set, densified by rotation; None for an empty set."""
+    if not grams:
+        return None
+    mask = _BINS - 1
+    bins = [None] * _BINS
+    for gram in grams:
+        h = zlib.crc32(gram.encode('utf-8'))
+        b, v = h & mask, h >> _BIN_SHIFT
+        current = bins[b]
+        if current is None or v < current:
+            bins[b] = v
+    filled = list(bins)
+    for i in range(_BINS):
+        if filled[i] is None:
+            # borrow the next non-empty bin to the right, offset by the distance
+            j = i + 1
+            while filled[j % _BINS] is None:
+                j += 1
+            bins[i] = filled[j % _BINS] + (j - i) * _ROTATION
+    return bins
+
+
+def band_keys(sig):
+    """One signed 64-bit key per LSH band (stable across processes)."""
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = sig[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = blake2b(struct.pack(f'<B{LSH_ROWS}Q', band, *chunk), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def install_signatures(conn):
+    """Create the delete trigger (SQLite only); signatures are written by the write paths."""
+    if conn.dialect.name != 'sqlite':
+        return False
+    for ddl in SIGNATURE_TRIGGERS.values():
+        conn.execute(text(ddl))
+    return True
+
+
+def _signature_values(rows):
+    """item_signature rows for (id, description, description_key) rows; unhashable ones are left out."""
+    values = []
+    for item_id, description, key in rows:
+        sig = signature(ngrams(description)) if key else None
+        if sig is None:
+            continue
+        entry = {'item_id': item_id, 'description_key': key}
+        entry.update(zip((c.name for c in _BAND_COLUMNS), band_keys(sig)))
+        values.append(entry)
+    return values
+
+
+def sign_items(rows, conn=None):
+    """
+    Replace the signatures of (id, description, description_key) rows, in the
+    caller's transaction (`conn`, or db.session). Returns how many were written.
+    """
+    execute = (conn or db.session).execute
+    sig_table = ItemSignature.__table__
+    ids = [r[0] for r in rows]
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        execute(delete(sig_table).where(sig_table.c.item_id.in_(ids[start:start + LOOKUP_CHUNK])))
+    values = _signature_values(rows)
+    if values:
+        execute(insert(sig_table), values)
+    return len(values)
+
+
+def sign_new_items(after, session=None):
+    """Sign the items with id > `after` (a bulk insert that just ran in `session`'s transaction)."""
+    session = session or db.session
+    item = Item.__table__
+    rows = session.execute(
+        select(item.c.id, item.c.description, item.c.description_key)
+        .where(item.c.id > after).where(item.c.description_key.isnot(None))).all()
+    if not rows:
+        return 0
+    values = _signature_values(rows)
+    if values:
+        session.execute(insert(ItemSignature.__table__), values)
+    return len(values)
+
+
+def refresh_signatures(chunk_size=5000):
+    """
+    Backfill: hash every item whose signature is missing or stale, committing
+    per chunk; returns how many were (re)computed. Run by `flask
+    refresh-signatures`, not on the request path.
+    """
+    sig_table, item = ItemSignature.__table__, Item.__table__
+    stale = (
+        select(item.c.id, item.c.description, item.c.description_key)
+        .select_from(item.outerjoin(sig_table, sig_table.c.item_id == item.c.id))
+        .where(item.c.description_key.isnot(None))
+        .where(or_(sig_table.c.item_id.is_(None), sig_table.c.description_key != item.c.description_key))
+        .order_by(item.c.id)
+        .limit(chunk_size)
+    )
+    refreshed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(stale.where(item.c.id > last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        refreshed += sign_items(rows)
+        db.session.commit()
+    return refreshed
+
+
+# ORM writes: re-sign items whose description key was set or changed in the flush
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _sign_flushed_items(session, flush_context):
+    rows = []
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Item) and obj.id is not None and (
+                obj in session.new or inspect(obj).attrs.description_key.history.has_changes()):
+            rows.append((obj.id, obj.description, obj.description_key))
+    if rows:
+        sign_items(rows, session.connection())
+
+
+class NearDuplicateFinder:
+    """
+    Flags import rows that are probably duplicates of a catalog item or of an
+    earlier row of the same file.
+
+    `prepare()` notes where the catalog ends before the import starts;
+    `check()` takes the rows a batch is about to insert and returns one match
+    dict per flagged row.
+    """
+
+    def __init__(self, threshold=0.8, max_reported=200, max_candidates=50, max_bucket=20):
+        self.threshold = threshold
+        self.max_reported = max_reported
+        self.max_candidates = max_candidates
+        # a band key shared by more items than this says nothing about any one
+        # of them (a whole product family), so it is ignored like a stopword
+        self.max_bucket = max_bucket
+        # catalog lookups are cached for the whole import and only see items
+        # that existed before it (rows it inserts are signed as they go, but
+        # are matched as earlier file rows instead):
+        # band key -> [item_id], or None for a key that is too common
+        self._buckets = [{} for _ in range(LSH_BANDS)]
+        self._descriptions = {}  # item_id -> description; None if it changed since hashing
+        self._item_grams = {}
+        # rows of this file seen so far: one dict per band, band key -> [(row_no, description, grams)]
+        self._file_bands = [{} for _ in range(LSH_BANDS)]
+        self._max_item_id = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(threshold=config.get('IMPORT_FUZZY_THRESHOLD', 0.8),
+                   max_reported=config.get('IMPORT_FUZZY_MAX_REPORTED', 200))
+
+    def prepare(self):
+        """Record the highest existing item id; signatures are already maintained by the write paths."""
+        self._max_item_id = db.session.execute(select(func.coalesce(func.max(Item.id), 0))).scalar()
+        return self._max_item_id
+
+    def _load_buckets(self, keyed_rows):
+        """Fetch the catalog items behind every band key of `keyed_rows` not looked up yet."""
+        sig_table, item = ItemSignature.__table__, Item.__table__
+        for i, col in enumerate(_BAND_COLUMNS):
+            cache = self._buckets[i]
+            missing = list({r[3][i] for r in keyed_rows} - cache.keys())
+            for start in range(0, len(missing), LOOKUP_CHUNK):
+                part = missing[start:start + LOOKUP_CHUNK]
+                # counting walks the band index only; hot keys are never fetched
+                hot = db.session.execute(
+                    select(col).where(col.in_(part)).group_by(col)
+                    .having(func.count() > self.max_bucket)).scalars().all()
+                cache.update(dict.fromkeys(hot))
+                cold = [k for k in part if k not in cache]
+                for key in cold:
+                    cache[key] = []
+                if cold:
+                    lookup = select(sig_table.c.item_id, col).where(col.in_(cold))
+                    if self._max_item_id is not None:
+                        lookup = lookup.where(sig_table.c.item_id <= self._max_item_id)
+                    for item_id, key in db.session.execute(lookup):
+                        cache[key].append(item_id)
+
+        ids = list({item_id for i in range(LSH_BANDS) for r in keyed_rows
+                    for item_id in self._buckets[i][r[3][i]] or ()} - self._descriptions.keys())
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            part = ids[start:start + LOOKUP_CHUNK]
+            self._descriptions.update(dict.fromkeys(part))
+            self._descriptions.update(db.session.execute(
+                select(sig_table.c.item_id, item.c.description)
+                .join(item, and_(item.c.id == sig_table.c.item_id,
+                                 item.c.description_key == sig_table.c.description_key))
+                .where(sig_table.c.item_id.in_(part))).all())
+
+    def check(self, rows):
+        """`rows` is [(row_no, description)]; returns [{row, description, score, match}] for near duplicates."""
+        keyed = []
+        for row_no, description in rows:
+            grams = ngrams(description)
+            sig = signature(grams)
+            if sig is not None:
+                keyed.append((row_no, description, grams, band_keys(sig)))
+        if not keyed:
+            return []
+
+        self._load_buckets(keyed)
+        item_grams = self._item_grams
+        matches = []
+        for row_no, description, grams, keys in keyed:
+            best = None
+            seen = set()
+            for i, key in enumerate(keys):
+                for item_id in self._buckets[i][key] or ():
+                    item_desc = self._descriptions[item_id]
+                    if item_desc is None or item_id in seen or len(seen) >= self.max_candidates:
+                        continue
+                    seen.add(item_id)
+                    if item_id not in item_grams:
+                        item_grams[item_id] = ngrams(item_desc)
+                    score = similarity(grams, item_grams[item_id], self.threshold)
+                    if score >= self.threshold and (best is None or score > best[0]):
+                        best = (score, {'id': item_id, 'description': item_desc})
+                earlier = self._file_bands[i].get(key, ())
+                if len(earlier) > self.max_bucket:
+                    continue
+                for prev_row, prev_desc, prev_grams in earlier:
+                    if ('row', prev_row) in seen or len(seen) >= self.max_candidates:
+                        continue
+                    seen.add(('row', prev_row))
+                    score = similarity(grams, prev_grams, self.threshold)
+                    if score >= self.threshold and (best is None or score > best[0]):
+                        best = (score, {'row': prev_row, 'description': prev_desc})
+            if best is not None:
+                matches.append({'row': row_no, 'description': description,
+                                'score': round(best[0], 3), 'match': best[1]})
+            for i, key in enumerate(keys):
+                earlier = self._file_bands[i].setdefault(key, [])
+                # one past the limit marks the key as too common; stop growing it
+                if len(earlier) <= self.max_bucket:
+                    earlier.append((row_no, description, grams))
+        return matches
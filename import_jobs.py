@@ -0,0 +1,242 @@
+"""
+Background import jobs.
+
+An upload is spooled to disk and handed to a small, bounded thread pool so a
+large supplier file doesn't hold a request worker for the whole run. Progress
+is read from the job's ImportResult counters while the import is running.
+
+Jobs run in the process that accepted the upload, but with several server
+workers the status poll can land on any of them, so the job's status is also
+published to the `import_job` table: when it is queued, at most every
+IMPORT_JOB_PUBLISH_SECONDS while it runs, and when it ends. A heartbeat thread
+republishes queued and running jobs at the same interval, so a record that
+hasn't moved for IMPORT_JOB_STALE_INTERVALS intervals belongs to a worker that
+died, and the job is reported failed. A worker that doesn't own the job
+answers from there; IMPORT_JOB_TTL only decides when records are pruned.
+"""
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from extensions import db
+from importer import ImportResult, UploadReadError, import_rows, read_upload, is_spreadsheet
+from dedup import NearDuplicateFinder
+from models import ImportJobState
+
+
+class JobQueueFull(Exception):
+    """Raised when too many imports are already queued or running."""
+
+
+class ImportJob:
+    def __init__(self, filename, path, fuzzy=False):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.fuzzy = fuzzy
+        self.status = 'queued'
+        self.message = ''
+        self.result = ImportResult()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.bytes_total = os.path.getsize(path)
+        self._stream = None
+        self._published = 0.0
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def progress(self):
+        """Fraction of the file consumed (CSV only; spreadsheets are zipped)."""
+        if self.status == 'done':
+            return 1.0
+        if self._stream is None or not self.bytes_total or is_spreadsheet(self.filename):
+            return None
+        try:
+            return min(1.0, self._stream.tell() / self.bytes_total)
+        except (ValueError, OSError):
+            return None
+
+    def to_dict(self):
+        elapsed = 0.0
+        if self.started:
+            elapsed = (self.finished or time.time()) - self.started
+        data = {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "message": self.message,
+            "rows_parsed": self.result.total,
+            "imported": self.result.imported,
+            "skipped": self.result.skipped,
+            "errors": self.result.errors,
+            "elapsed": round(elapsed, 3),
+            "rows_per_sec": round(self.result.total / elapsed, 1) if elapsed > 0 else 0.0,
+            "progress": self.progress(),
+        }
+        if not self.active:
+            data.update(self.result.to_dict())
+        return data
+
+
+class ImportJobManager:
+    """Owns the worker pool and the job registry for one app (in-process, mirrored to `import_job`)."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._heartbeat = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('IMPORT_WORKERS', 2)
+        self.max_pending = app.config.get('IMPORT_MAX_PENDING_JOBS', 4)
+        self.job_ttl = app.config.get('IMPORT_JOB_TTL', 3600)
+        self.publish_interval = app.config.get('IMPORT_JOB_PUBLISH_SECONDS', 1.0)
+        self.stale_after = self.publish_interval * app.config.get('IMPORT_JOB_STALE_INTERVALS', 10)
+        self.spool_dir = app.config.get('IMPORT_SPOOL_DIR') or tempfile.gettempdir()
+        app.extensions['import_jobs'] = self
+
+    @property
+    def executor(self):
+        # threads are only started once the first async import arrives
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import')
+        return self._executor
+
+    def submit(self, file, fuzzy=False):
+        """Spool an uploaded FileStorage to disk and queue it for import (`fuzzy`: flag near-duplicates)."""
+        with self._lock:
+            self._prune()
+            if sum(1 for j in self.jobs.values() if j.active) >= self.max_pending:
+                raise JobQueueFull("Too many imports in progress. Try again shortly.")
+
+            suffix = os.path.splitext(file.filename or '')[1].lower()
+            fd, path = tempfile.mkstemp(prefix='import_', suffix=suffix, dir=self.spool_dir)
+            with os.fdopen(fd, 'wb') as out:
+                file.save(out)
+            job = ImportJob(file.filename or '', path, fuzzy=fuzzy)
+            self.jobs[job.id] = job
+
+        self._publish(job, force=True)
+        self.executor.submit(self._run, job)
+        self._start_heartbeat()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        """
+        Status dict of a job: live when this process runs it, otherwise as last
+        published by the worker that does. None for an unknown or expired job.
+        """
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        record = db.session.get(ImportJobState, job_id)
+        if record is None:
+            return None
+        data = json.loads(record.state)
+        if data['status'] in ('queued', 'running') and \
+                record.updated_at < datetime.utcnow() - timedelta(seconds=self.stale_after):
+            # the owning worker's heartbeat stopped without a final status
+            data.update(status='failed', message='Import stopped: the worker running it went away.')
+        return data
+
+    def _publish(self, job, force=False):
+        """Write the job's status to `import_job` (throttled unless `force`)."""
+        now = time.monotonic()
+        if not force and now - job._published < self.publish_interval:
+            return
+        job._published = now
+        try:
+            db.session.merge(ImportJobState(id=job.id, status=job.status,
+                                            state=json.dumps(job.to_dict()), updated_at=datetime.utcnow()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.app.logger.warning("Could not publish status of import job %s", job.id, exc_info=True)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name='import-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        """Republish every active job each interval until none is left (runs in its own thread)."""
+        with self.app.app_context():
+            while True:
+                time.sleep(self.publish_interval)
+                with self._lock:
+                    active = [j for j in self.jobs.values() if j.active]
+                    if not active:
+                        self._heartbeat = None
+                        return
+                for job in active:
+                    self._publish(job)
+                db.session.remove()
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [k for k, j in self.jobs.items() if j.finished and j.finished < cutoff]:
+            del self.jobs[job_id]
+        try:
+            db.session.execute(ImportJobState.__table__.delete().where(
+                ImportJobState.updated_at < datetime.utcnow() - timedelta(seconds=self.job_ttl)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.app.logger.warning("Could not prune import jobs", exc_info=True)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started = time.time()
+        with self.app.app_context():
+            self._publish(job, force=True)
+            try:
+                with open(job.path, 'rb') as stream:
+                    job._stream = stream
+                    header, raw_rows = read_upload(stream, job.filename)
+                    if header is None:
+                        job.status = 'failed'
+                        job.message = "Spreadsheet is empty." if is_spreadsheet(job.filename) else "CSV is empty."
+                        return
+                    import_rows(
+                        header, raw_rows, result=job.result,
+                        batch_size=self.app.config.get('IMPORT_BATCH_SIZE', 1000),
+                        use_savepoints=self.app.config.get('IMPORT_USE_SAVEPOINTS', False),
+                        near_duplicates=NearDuplicateFinder.from_config(self.app.config) if job.fuzzy else None,
+                        progress=lambda result: self._publish(job)
+                    )
+                job.status = 'done'
+            except UploadReadError as e:
+                job.status = 'failed'
+                job.message = f"Failed to read uploaded file after row {job.result.total}: {e}"
+            except Exception as e:
+                self.app.logger.exception("Background import failed")
+                db.session.rollback()
+                job.status = 'failed'
+                job.message = f"Import failed: {e}"
+            finally:
+                job._stream = None
+                job.finished = time.time()
+                self._publish(job, force=True)
+                try:
+                    os.remove(job.path)
+                except OSError:
+                    pass
+
+
+import_jobs = ImportJobManager()
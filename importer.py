@@ -0,0 +1,481 @@
+"""
+Bulk write engine for item imports.
+
+Rows are plain dicts of Item column values. They are buffered and written in
+batches with a single Core INSERT (executemany) per batch, committing after
+each batch so a bad row late in a file doesn't roll back everything before it.
+
+Uploads are parsed lazily: `read_upload()` wraps the file in a text stream
+(CSV) or a read-only workbook (XLSX) and yields one row at a time, so import
+memory depends on the batch size rather than the file size.
+"""
+import io
+import csv
+from functools import lru_cache
+from itertools import islice
+from flask import current_app
+from changes import compact_after_write
+from extensions import db
+from models import Item, apply_item_defaults, normalize_description
+from parsing import fill_missing
+from schema import deferred_insert_triggers
+
+
+SPREADSHEET_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+
+class UploadReadError(Exception):
+    """Raised when the uploaded file can't be decoded or parsed mid-stream."""
+
+
+def is_spreadsheet(filename):
+    return (filename or '').lower().endswith(SPREADSHEET_EXTENSIONS)
+
+
+def read_upload(stream, filename):
+    """
+    Open an uploaded CSV/XLSX binary stream for streaming.
+
+    Returns (header, rows): `header` is the lower-cased first row (None when the
+    file is empty) and `rows` is a generator of raw row sequences.
+    """
+    if is_spreadsheet(filename):
+        import openpyxl
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        rows = _iter_sheet(wb)
+    else:
+        # tolerate BOM; newline='' lets csv handle quoted line breaks
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        rows = _iter_csv(text)
+
+    first = next(rows, None)
+    if first is None:
+        return None, rows
+    header = [str(h).strip().lower() if h is not None else '' for h in first]
+    return header, rows
+
+
+def _iter_sheet(wb):
+    try:
+        for r in wb.active.iter_rows(values_only=True):
+            yield r
+    except Exception as e:
+        raise UploadReadError(str(e)) from e
+    finally:
+        wb.close()
+
+
+def _iter_csv(text):
+    try:
+        for r in csv.reader(text):
+            yield r
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise UploadReadError(str(e)) from e
+
+
+# Columns written by the import path; every row is normalised to this key set
+# so each batch is a single executemany (None values get the Item column defaults).
+IMPORT_COLUMNS = (
+    'description', 'description_key', 'item_group', 'mrp', 'item_size', 'main_unit', 'alt_unit',
+    'alt_qty', 'purc_price', 'bulk_sp1', 'bulk_sp2', 'sale_price', 'supplier',
+)
+
+
+class BulkItemWriter:
+    """
+    Buffer validated rows and insert them in batches of `batch_size`.
+
+    With `use_savepoints`, a batch that fails as a whole is retried row by row
+    inside savepoints so only the offending rows are dropped; without it the
+    failed batch is rolled back and reported. Either way earlier batches stay
+    committed.
+    """
+
+    def __init__(self, session=None, batch_size=1000, use_savepoints=False):
+        self.session = session or db.session
+        self.batch_size = max(1, int(batch_size))
+        self.use_savepoints = use_savepoints
+        self.batches = []
+        self.inserted = 0
+        self.failed = 0
+        self.row_errors = []
+        self._pending = []
+        self._pending_rows = []
+        self._stmt = Item.__table__.insert()
+
+    def add(self, values, row_no=None):
+        """Queue one row; flushes automatically when the batch is full."""
+        self._pending.append(apply_item_defaults({c: values.get(c) for c in IMPORT_COLUMNS}))
+        self._pending_rows.append(row_no)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return None
+        rows, row_nos = self._pending, self._pending_rows
+        self._pending, self._pending_rows = [], []
+
+        outcome = {
+            "batch": len(self.batches) + 1,
+            "rows": len(rows),
+            "inserted": 0,
+            "failed": 0,
+            "status": "committed",
+        }
+        try:
+            with deferred_insert_triggers(self.session):
+                self.session.execute(self._stmt, rows)
+            self.session.commit()
+            outcome["inserted"] = len(rows)
+        except Exception as e:
+            self.session.rollback()
+            if self.use_savepoints:
+                self._insert_rows_individually(rows, row_nos, outcome)
+            else:
+                outcome["failed"] = len(rows)
+                outcome["status"] = "rolled_back"
+                outcome["error"] = str(getattr(e, 'orig', e))
+
+        self.inserted += outcome["inserted"]
+        self.failed += outcome["failed"]
+        self.batches.append(outcome)
+        return outcome
+
+    def _insert_rows_individually(self, rows, row_nos, outcome):
+        with deferred_insert_triggers(self.session):
+            for values, row_no in zip(rows, row_nos):
+                try:
+                    with self.session.begin_nested():
+                        self.session.execute(self._stmt, [values])
+                    outcome["inserted"] += 1
+                except Exception as e:
+                    outcome["failed"] += 1
+                    self.row_errors.append(f"Row {row_no}: error {getattr(e, 'orig', e)}")
+        try:
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            outcome["inserted"] = 0
+            outcome["failed"] = len(rows)
+            outcome["error"] = str(getattr(e, 'orig', e))
+        if outcome["failed"]:
+            outcome["status"] = "partial" if outcome["inserted"] else "rolled_back"
+
+    def finish(self):
+        """Flush the last partial batch and return per-batch outcomes."""
+        self.flush()
+        return self.batches
+
+
+# Accept common column names -> field names
+KEY_MAP_CANDIDATES = {
+    'description': ['description', 'item description', 'name', 'item_name'],
+    'item_group': ['item_group', 'group', 'category'],
+    'mrp': ['mrp', 'price', 'mrp₹', 'mrp (₹)'],
+    'item_size': ['item_size', 'size'],
+    'main_unit': ['main_unit', 'main'],
+    'alt_unit': ['alt_unit', 'alt'],
+    'alt_qty': ['alt_qty','altqty','qty','quantity'],
+    'purc_price': ['purc_price','purchase','purchase_price','purc_price'],
+    'bulk_sp1': ['bulk_sp1','bsp1','bulk1'],
+    'bulk_sp2': ['bulk_sp2','bsp2','bulk2'],
+    'sale_price': ['sale_price','sale','selling_price'],
+    'supplier': ['supplier','vendor']
+}
+
+
+# normalize description for duplicate checks; same rules as Item.description_key
+norm_desc = normalize_description
+
+
+def existing_description_keys(keys, chunk_size=500):
+    """Return the subset of `keys` already present in item.description_key."""
+    keys = list(keys)
+    found = set()
+    column = Item.description_key
+    for start in range(0, len(keys), chunk_size):
+        part = keys[start:start + chunk_size]
+        found.update(k for (k,) in db.session.query(column).filter(column.in_(part)))
+    return found
+
+
+def map_headers(header):
+    """Build reverse map header_key -> canonical field."""
+    header_to_field = {}
+    # ordered de-dup keeps the fuzzy pass deterministic
+    sample_headers = list(dict.fromkeys(header))
+
+    for field, cand in KEY_MAP_CANDIDATES.items():
+        for c in cand:
+            if c in sample_headers:
+                header_to_field[c] = field
+
+    # If header_to_field incomplete, try fuzzy: match by startswith/contains
+    for h in sample_headers:
+        if h in header_to_field:
+            continue
+        for field, cand in KEY_MAP_CANDIDATES.items():
+            for c in cand:
+                if c in h or h in c:
+                    header_to_field[h] = field
+                    break
+            if h in header_to_field:
+                break
+    return header_to_field
+
+
+class ImportResult:
+    """Running counters for one import; safe to read from another thread."""
+
+    def __init__(self):
+        self.total = 0
+        self.imported = 0
+        self.skipped = 0
+        self.errors = 0
+        self.skipped_examples = []
+        self.batches = []
+        # set when the fuzzy stage runs
+        self.probable_duplicates = None
+        self.near_duplicates = []
+
+    def note(self, msg, limit=10):
+        """Keep the first few skip/error messages; the rest only count."""
+        if len(self.skipped_examples) < limit:
+            self.skipped_examples.append(msg)
+
+    def to_dict(self):
+        data = {
+            "total": self.total,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "skipped_examples": self.skipped_examples[:10],
+            "batches": self.batches
+        }
+        if self.probable_duplicates is not None:
+            data["probable_duplicates"] = self.probable_duplicates
+            data["near_duplicates"] = self.near_duplicates
+        return data
+
+
+def _to_text(v):
+    return str(v) if v else ''
+
+
+def _to_float(v):
+    # parse numeric fields safely; unparseable values become NULL
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    v = str(v).strip()
+    if v == '':
+        return None
+    try:
+        return float(v.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _to_qty(v):
+    v = _to_float(v)
+    return int(v) if v is not None else None
+
+
+def _to_mrp(v):
+    if v is None:
+        return None
+    s = str(v).strip()
+    if s == '':
+        return None
+    # non-numeric MRP is a row error, as before
+    return int(s) if s.isdigit() else float(v)
+
+
+# field -> converter applied column-wise to every batch
+FIELD_CONVERTERS = {
+    'item_group': _to_text,
+    'mrp': _to_mrp,
+    'item_size': _to_text,
+    'main_unit': _to_text,
+    'alt_unit': _to_text,
+    'alt_qty': _to_qty,
+    'purc_price': _to_float,
+    'bulk_sp1': _to_float,
+    'bulk_sp2': _to_float,
+    'sale_price': _to_float,
+    'supplier': _to_text,
+}
+
+
+class ImportSchema:
+    """
+    Header -> field -> column index mapping, resolved once per file.
+
+    `convert()` turns a batch of raw rows into Item value dicts column by
+    column, so the per-row cost is a fixed set of indexed lookups.
+    """
+
+    def __init__(self, header):
+        self.header = tuple(header)
+        header_to_field = map_headers(self.header)
+        # last occurrence wins for repeated headers (same as building a dict per row)
+        position = {h: i for i, h in enumerate(self.header)}
+        self.index = {}
+        for h, field in header_to_field.items():
+            self.index.setdefault(field, position[h])
+        self.converters = [
+            (field, self.index[field], conv)
+            for field, conv in FIELD_CONVERTERS.items() if field in self.index
+        ]
+        # fields the file doesn't have get what their converter makes of an
+        # empty cell: '' for text, None for numbers
+        self.missing = {f: conv(None) for f, conv in FIELD_CONVERTERS.items() if f not in self.index}
+
+    @staticmethod
+    def _column(rows, i):
+        return [r[i] if i < len(r) else None for r in rows]
+
+    def convert(self, rows):
+        """
+        Convert a batch of raw row sequences.
+
+        Returns (descriptions, values, row_errors): `descriptions` holds the raw
+        description cell per row, `values` one dict of converted columns per
+        row, and `row_errors` maps batch offset -> message for cells that
+        failed conversion.
+        """
+        n = len(rows)
+        row_errors = {}
+        if 'description' in self.index:
+            descriptions = self._column(rows, self.index['description'])
+        else:
+            descriptions = [None] * n
+
+        columns = []
+        for field, i, conv in self.converters:
+            out = []
+            append = out.append
+            for pos, v in enumerate(self._column(rows, i)):
+                try:
+                    append(conv(v))
+                except Exception as ex:
+                    append(None)
+                    row_errors.setdefault(pos, f"error {ex}")
+            columns.append((field, out))
+
+        values = [dict(self.missing) for _ in range(n)]
+        for field, out in columns:
+            for row_values, v in zip(values, out):
+                row_values[field] = v
+        return descriptions, values, row_errors
+
+
+@lru_cache(maxsize=32)
+def _compiled_schema(header):
+    return ImportSchema(header)
+
+
+def compile_schema(header):
+    """Return the (cached) ImportSchema for a header row."""
+    return _compiled_schema(tuple(header))
+
+
+def import_rows(header, raw_rows, result=None, batch_size=1000, use_savepoints=False, near_duplicates=None,
+                progress=None):
+    """
+    Validate rows from `read_upload()` and write them through BulkItemWriter.
+
+    Rows are pulled from the stream `batch_size` at a time and converted by the
+    compiled ImportSchema. Skips duplicates by matching normalized description.
+    With a `near_duplicates` finder (dedup.NearDuplicateFinder) the rows that
+    pass are also checked for probable duplicates, which are reported on
+    `result` but still imported.
+    Counters on `result` are updated as rows are consumed so progress can be
+    polled while this runs; `progress(result)`, if given, is called after
+    every batch. Raises UploadReadError if the file breaks
+    mid-stream (rows before it are kept).
+    """
+    result = result or ImportResult()
+    schema = compile_schema(header)
+    if near_duplicates is not None:
+        near_duplicates.prepare()
+        result.probable_duplicates = 0
+
+    # normalized keys accepted so far in this file; the catalog itself is only
+    # probed for the keys in the current batch
+    seen_in_file = set()
+
+    writer = BulkItemWriter(batch_size=batch_size, use_savepoints=use_savepoints)
+    raw_rows = iter(raw_rows)
+    row_no = 0
+    try:
+        while True:
+            chunk = list(islice(raw_rows, writer.batch_size))
+            if not chunk:
+                break
+            descriptions, batch_values, row_errors = schema.convert(chunk)
+            # group / MRP / units the file left empty come from description and size
+            fill_missing(descriptions, batch_values)
+            batch_keys = [norm_desc(d) for d in descriptions]
+            in_catalog = existing_description_keys({k for k in batch_keys if k})
+            accepted = []
+            for pos, (desc, desc_norm, values) in enumerate(zip(descriptions, batch_keys, batch_values)):
+                row_no += 1
+                result.total += 1
+                desc = desc or ''
+                # Skip empty description
+                if not desc_norm:
+                    result.skipped += 1
+                    result.note(f"Row {row_no}: empty description")
+                    continue
+
+                # Duplicate check by normalized description
+                if desc_norm in in_catalog or desc_norm in seen_in_file:
+                    result.skipped += 1
+                    result.note(f"Row {row_no}: duplicate '{desc}'")
+                    continue
+
+                if pos in row_errors:
+                    result.errors += 1
+                    result.note(f"Row {row_no}: {row_errors[pos]}")
+                    continue
+
+                values['description'] = str(desc).strip()
+                values['description_key'] = desc_norm
+                problems = Item.validate_values(values)
+                if problems:
+                    result.errors += 1
+                    result.note(f"Row {row_no}: {'; '.join(problems)}")
+                    continue
+
+                writer.add(values, row_no=row_no)
+                # track so subsequent rows in same import won't be duplicated
+                seen_in_file.add(desc_norm)
+                accepted.append((row_no, values['description']))
+            if near_duplicates is not None:
+                for match in near_duplicates.check(accepted):
+                    result.probable_duplicates += 1
+                    if len(result.near_duplicates) < near_duplicates.max_reported:
+                        result.near_duplicates.append(match)
+            result.imported = writer.inserted
+            if progress is not None:
+                progress(result)
+    finally:
+        # on UploadReadError keep whatever was already parsed
+        try:
+            writer.finish()
+        except Exception:
+            db.session.rollback()
+            raise
+        for b in writer.batches:
+            if b.get("error"):
+                current_app.logger.error(f"Import batch {b['batch']} failed: {b['error']}")
+        result.imported = writer.inserted
+        result.errors += writer.failed
+        for msg in writer.row_errors:
+            result.note(msg)
+        result.batches = writer.batches
+    compact_after_write()
+    return result
@@ -0,0 +1,189 @@
+"""
+Per-request instrumentation and Prometheus text exposition.
+
+Each request records its latency in a per-endpoint histogram. SQLAlchemy
+engine events count the statements a request runs and their time, and Jinja
+signals time template rendering. Views can time their own sections with
+`server_timing('name')`. The breakdown is sent back in a `Server-Timing`
+header, so browser devtools show where a slow /records spent its time.
+
+Metrics live in process memory; under several gunicorn workers each worker
+exposes its own numbers on /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# request latency buckets, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Request / SQL counters for one app; `metrics.init_app(app)` installs the hooks."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.latency = {}  # (endpoint, method) -> Histogram
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.sql_count = {}  # endpoint -> statements
+        self.sql_seconds = {}  # endpoint -> seconds in SQL
+        self.db_health_seconds = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.extensions['metrics'] = self
+
+    # -- request hooks -----------------------------------------------------
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.timings = {}
+
+    def _after_request(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint == 'static':
+            return response
+
+        with self._lock:
+            key = (endpoint, request.method)
+            hist = self.latency.get(key)
+            if hist is None:
+                hist = self.latency[key] = Histogram()
+            hist.observe(elapsed)
+            status_key = (endpoint, request.method, response.status_code)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self.sql_count[endpoint] = self.sql_count.get(endpoint, 0) + g.sql_count
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + g.sql_seconds
+
+        parts = [f'app;dur={elapsed * 1000:.1f}',
+                 f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_count} queries"']
+        parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in g.timings.items()]
+        response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    def _before_render(self, sender, template, context, **extra):
+        if has_request_context():
+            g.render_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        if has_request_context() and g.get('render_started') is not None:
+            add_timing('render', time.perf_counter() - g.render_started)
+
+    # -- exposition ----------------------------------------------------------
+
+    def render(self):
+        """Prometheus text format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP http_request_duration_seconds Request latency by endpoint.',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (endpoint, method), hist in sorted(self.latency.items()):
+                labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {hist.sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {hist.count}')
+
+            lines += ['# HELP http_requests_total Requests by endpoint and status.',
+                      '# TYPE http_requests_total counter']
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {n}')
+
+            lines += ['# HELP db_queries_total SQL statements executed, by endpoint.',
+                      '# TYPE db_queries_total counter']
+            for endpoint, n in sorted(self.sql_count.items()):
+                lines.append(f'db_queries_total{{endpoint="{_label(endpoint)}"}} {n}')
+
+            lines += ['# HELP db_query_seconds_total Time spent in SQL, by endpoint.',
+                      '# TYPE db_query_seconds_total counter']
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'db_query_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+
+            if self.db_health_seconds is not None:
+                lines += ['# HELP db_health_latency_seconds Latency of the last /health database check.',
+                          '# TYPE db_health_latency_seconds gauge',
+                          f'db_health_latency_seconds {self.db_health_seconds:.6f}']
+        return '\n'.join(lines) + '\n'
+
+
+def add_timing(name, seconds):
+    """Add `seconds` to this request's Server-Timing entry `name`."""
+    if has_request_context() and 'timings' in g:
+        g.timings[name] = g.timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def server_timing(name):
+    """Time a block of a view into the Server-Timing header."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - t0)
+
+
+# SQL statement count / time for the current request, on every engine
+# (including the SQLite write engine)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('query_started')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+
+metrics = Metrics()
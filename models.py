@@ -1,6 +1,28 @@
 from datetime import datetime
 from extensions import db
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, Computed, Index
+from sqlalchemy.orm import validates
+
+
+def normalize_description(s):
+    """Duplicate-detection key: whitespace-collapsed, casefolded description"""
+    if s is None:
+        return ''
+    return ' '.join(str(s).strip().split()).casefold()
+
+
+def margin_sql(price):
+    """Margin % of `price` over purc_price; 0 without a purchase price or sell price"""
+    return (f"CASE WHEN purc_price > 0 AND {price} <> 0 "
+            f"THEN ({price} - purc_price) * 100.0 / purc_price ELSE 0 END")
+
+
+# generated margin column -> the price it is computed from
+MARGIN_COLUMNS = {
+    'margin_bsp1': 'bulk_sp1',
+    'margin_bsp2': 'bulk_sp2',
+    'margin_sale': 'sale_price',
+}
 
 
 class Item(db.Model):
@@ -9,6 +31,7 @@ class Item(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(500), nullable=False, index=True)
+    description_key = db.Column(db.String(500), nullable=True, unique=True, index=True)
     item_group = db.Column(db.String(100), nullable=True, index=True)
     mrp = db.Column(db.Integer, nullable=True)
     item_size = db.Column(db.String(100), nullable=True)
@@ -22,8 +45,17 @@ class Item(db.Model):
     supplier = db.Column(db.String(200), nullable=True, index=True)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    # margin percentages, computed by the database so they can be indexed,
+    # filtered and sorted on (unrounded; round for display)
+    margin_bsp1 = db.Column(db.Float, Computed(margin_sql('bulk_sp1'), persisted=True), index=True)
+    margin_bsp2 = db.Column(db.Float, Computed(margin_sql('bulk_sp2'), persisted=True), index=True)
+    margin_sale = db.Column(db.Float, Computed(margin_sql('sale_price'), persisted=True), index=True)
+
     # Add constraints for data integrity
     __table_args__ = (
+        # "sale margin under N% in group X" is a range scan on this index
+        Index('ix_item_group_margin_sale', 'item_group', 'margin_sale'),
+        Index('ix_item_supplier_margin_sale', 'supplier', 'margin_sale'),
         CheckConstraint('mrp >= 0', name='check_mrp_positive'),
         CheckConstraint('purc_price >= 0', name='check_purc_price_positive'),
         CheckConstraint('bulk_sp1 >= 0', name='check_bulk_sp1_positive'),
@@ -32,6 +64,12 @@ class Item(db.Model):
         CheckConstraint('alt_qty >= 0', name='check_alt_qty_positive'),
     )
 
+    @validates('description')
+    def _sync_description_key(self, key, value):
+        """Keep the normalized duplicate key in step with the description"""
+        self.description_key = normalize_description(value) or None
+        return value
+
     def __repr__(self):
         return f'<Item {self.id}: {self.description[:30]}>'
 
@@ -54,50 +92,163 @@ class Item(db.Model):
             'last_updated': self.last_updated.isoformat() if self.last_updated else None
         }
 
-    @property
-    def margin_bsp1(self):
-        """Calculate margin percentage for bulk_sp1"""
-        if self.purc_price and self.purc_price > 0 and self.bulk_sp1:
-            return round(((self.bulk_sp1 - self.purc_price) / self.purc_price) * 100, 2)
-        return 0
-
-    @property
-    def margin_bsp2(self):
-        """Calculate margin percentage for bulk_sp2"""
-        if self.purc_price and self.purc_price > 0 and self.bulk_sp2:
-            return round(((self.bulk_sp2 - self.purc_price) / self.purc_price) * 100, 2)
-        return 0
-
-    @property
-    def margin_sale(self):
-        """Calculate margin percentage for sale_price"""
-        if self.purc_price and self.purc_price > 0 and self.sale_price:
-            return round(((self.sale_price - self.purc_price) / self.purc_price) * 100, 2)
-        return 0
-
     def validate(self):
         """Validate item data"""
+        return self.validate_values({
+            'description': self.description,
+            'mrp': self.mrp,
+            'purc_price': self.purc_price,
+            'bulk_sp1': self.bulk_sp1,
+            'bulk_sp2': self.bulk_sp2,
+            'sale_price': self.sale_price,
+            'alt_qty': self.alt_qty,
+        })
+
+    @staticmethod
+    def validate_values(values):
+        """Validate a plain dict of column values (used by bulk write paths)"""
         errors = []
 
-        if not self.description or not self.description.strip():
+        description = values.get('description')
+        if not description or not str(description).strip():
             errors.append('Description is required')
 
-        if self.mrp is not None and self.mrp < 0:
+        if values.get('mrp') is not None and values['mrp'] < 0:
             errors.append('MRP must be positive')
 
-        if self.purc_price is not None and self.purc_price < 0:
+        if values.get('purc_price') is not None and values['purc_price'] < 0:
             errors.append('Purchase price must be positive')
 
-        if self.bulk_sp1 is not None and self.bulk_sp1 < 0:
+        if values.get('bulk_sp1') is not None and values['bulk_sp1'] < 0:
             errors.append('Bulk SP1 must be positive')
 
-        if self.bulk_sp2 is not None and self.bulk_sp2 < 0:
+        if values.get('bulk_sp2') is not None and values['bulk_sp2'] < 0:
             errors.append('Bulk SP2 must be positive')
 
-        if self.sale_price is not None and self.sale_price < 0:
+        if values.get('sale_price') is not None and values['sale_price'] < 0:
             errors.append('Sale price must be positive')
 
-        if self.alt_qty is not None and self.alt_qty < 0:
+        if values.get('alt_qty') is not None and values['alt_qty'] < 0:
             errors.append('Alt quantity must be positive')
 
         return errors
+
+
+
+# scalar column defaults (alt_qty 0, prices 0.0); the ORM applies them when a
+# value is None, Core inserts of explicit None don't, so bulk paths fill them in
+ITEM_DEFAULTS = {c.name: c.default.arg for c in Item.__table__.columns
+                 if c.default is not None and c.default.is_scalar}
+
+
+def apply_item_defaults(row):
+    """Replace None values in an insert row with the Item column defaults (in place)."""
+    for name, default in ITEM_DEFAULTS.items():
+        if row.get(name, 0) is None:
+            row[name] = default
+    return row
+
+class GroupCatalog(db.Model):
+    """Per-group item counts for the group filter, maintained by triggers on item (see catalog.py)"""
+    __tablename__ = 'item_group_catalog'
+
+    item_group = db.Column(db.String(100), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<GroupCatalog {self.item_group}: {self.item_count}>'
+
+
+class CatalogVersion(db.Model):
+    """Single-row change counter for the item table, bumped by triggers (see catalog.py)"""
+    __tablename__ = 'catalog_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    descriptions = db.Column(db.Integer, nullable=False, default=0)  # bumped only when descriptions change
+
+
+class ItemSummary(db.Model):
+    """Per-group / per-supplier running aggregates, maintained by triggers on item (see analytics.py)"""
+    __tablename__ = 'item_summary'
+
+    dimension = db.Column(db.String(20), primary_key=True)  # 'group' or 'supplier'
+    key = db.Column(db.String(200), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    # margins only count items with a purchase price (margin_sale is 0 otherwise)
+    priced_count = db.Column(db.Integer, nullable=False, default=0)
+    margin_sum = db.Column(db.Float, nullable=False, default=0.0)
+    margin_min = db.Column(db.Float, nullable=True)
+    margin_max = db.Column(db.Float, nullable=True)
+    purc_count = db.Column(db.Integer, nullable=False, default=0)
+    purc_sum = db.Column(db.Float, nullable=False, default=0.0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    sale_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<ItemSummary {self.dimension}={self.key}: {self.item_count}>'
+
+
+class ItemSignature(db.Model):
+    """MinHash LSH band keys of an item's description, for near-duplicate lookups (see dedup.py)"""
+    __tablename__ = 'item_signature'
+
+    item_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # the description key the bands were computed from; a different key means stale
+    description_key = db.Column(db.String(500), nullable=False)
+    band0 = db.Column(db.BigInteger, nullable=False, index=True)
+    band1 = db.Column(db.BigInteger, nullable=False, index=True)
+    band2 = db.Column(db.BigInteger, nullable=False, index=True)
+    band3 = db.Column(db.BigInteger, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ItemSignature {self.item_id}>'
+
+
+class ItemChange(db.Model):
+    """Append-only log of item upserts ('U') and deletes ('D'), written by triggers (see changes.py)"""
+    __tablename__ = 'item_change'
+    __table_args__ = (
+        Index('ix_item_change_item_seq', 'item_id', 'seq'),
+        {'sqlite_autoincrement': True},  # seq values are never reused: they are sync tokens
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(1), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<ItemChange {self.seq} {self.op} {self.item_id}>'
+
+
+class ImportJobState(db.Model):
+    """Last published status of a background import, readable from any worker (see import_jobs.py)"""
+    __tablename__ = 'import_job'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)
+    state = db.Column(db.Text, nullable=False)  # JSON of ImportJob.to_dict()
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<ImportJobState {self.id}: {self.status}>'
+
+
+class AppMeta(db.Model):
+    """Small key/value store for app bookkeeping (e.g. the startup schema fingerprint)"""
+    __tablename__ = 'app_meta'
+
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(500), nullable=True)
+
+    def __repr__(self):
+        return f'<AppMeta {self.key}>'
+
+
+# app_meta row that exists only inside a bulk-insert transaction (never
+# committed, so only the inserting connection sees it): the AFTER INSERT
+# triggers on item stand down and the batch is applied set-based instead
+# (see schema.deferred_insert_triggers)
+BULK_INSERT_KEY = 'bulk_insert'
+ROW_TRIGGERS_ACTIVE = f"NOT EXISTS (SELECT 1 FROM app_meta WHERE key = '{BULK_INSERT_KEY}')"
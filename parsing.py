@@ -0,0 +1,158 @@
+"""
+Description / size parsing shared by the add-item form, imports and the
+catalog re-parse job.
+
+A description like "SOAP 100G (HYGIENE) 45/-" carries the item group in
+parentheses and the MRP before a '/' or '/-'; an item size like "1CTN=20PKD"
+gives the main unit, alt unit and alt quantity. Patterns are compiled once,
+and the batch functions parse whole columns in one call (repeated sizes are
+parsed once per call).
+"""
+import re
+from datetime import datetime
+from sqlalchemy import select, update, bindparam
+from extensions import db
+from models import Item
+
+GROUP_RE = re.compile(r'\(([^)]+)\)')
+# only a number directly before '/', '/-' or '//': '500/-', '500 / -'; not '20ML'
+MRP_RE = re.compile(r'(\d+(?:\.\d+)?)(?=\s*(?:\/-|\//|\/))')
+SIZE_RE = re.compile(r'(\d+)\s*([A-Za-z]+)\s*=\s*(\d+)\s*([A-Za-z]+)', re.I)
+
+NO_SIZE = ('', '', 0)
+# fields the parser can derive
+DERIVED_FIELDS = ('item_group', 'mrp', 'main_unit', 'alt_unit', 'alt_qty')
+
+
+def extract_group(desc):
+    if not desc:
+        return ''
+    m = GROUP_RE.search(desc)
+    return m.group(1).strip() if m else ''
+
+
+def extract_mrp(desc):
+    """
+    Only take a number that directly prefixes a '/' or '/-' token.
+    Example matches: '500/-', '500 / -', '500 /'
+    Will NOT match '20ML' or numbers followed by letters.
+    """
+    if not desc:
+        return 0
+    m = MRP_RE.search(desc)
+    if m:
+        try:
+            return int(float(m.group(1)))
+        except Exception:
+            return 0
+    return 0
+
+
+def extract_item_size(size):
+    """
+    Parse strings like '1CTN=20PKD' or '1 CTN = 20 PKD'
+    Returns (main_unit, alt_unit, alt_qty) or ('','',0)
+    """
+    if not size:
+        return NO_SIZE
+    m = SIZE_RE.search(size.strip())
+    if m:
+        return (m.group(2).upper(), m.group(4).upper(), int(m.group(3)))
+    return NO_SIZE
+
+
+def parse_descriptions(descriptions):
+    """Batch extract_group / extract_mrp: returns (groups, mrps) lists."""
+    groups, mrps = [], []
+    add_group, add_mrp = groups.append, mrps.append
+    for desc in descriptions:
+        desc = str(desc) if desc else ''
+        add_group(extract_group(desc))
+        add_mrp(extract_mrp(desc))
+    return groups, mrps
+
+
+def parse_sizes(sizes):
+    """Batch extract_item_size: returns a (main_unit, alt_unit, alt_qty) tuple per size."""
+    memo = {}
+    out = []
+    append = out.append
+    for size in sizes:
+        size = str(size) if size else ''
+        parsed = memo.get(size)
+        if parsed is None:
+            parsed = memo[size] = extract_item_size(size)
+        append(parsed)
+    return out
+
+
+def derive_fields(descriptions, sizes):
+    """One dict of parsed DERIVED_FIELDS per row (empty values where nothing parsed)."""
+    groups, mrps = parse_descriptions(descriptions)
+    return [
+        {'item_group': g, 'mrp': m, 'main_unit': main, 'alt_unit': alt, 'alt_qty': qty}
+        for g, m, (main, alt, qty) in zip(groups, mrps, parse_sizes(sizes))
+    ]
+
+
+def _empty(value):
+    return value is None or value == '' or value == 0
+
+
+def fill_missing(descriptions, values):
+    """
+    Fill empty derived fields of import row dicts in place from the parsed
+    description / item_size; values present in the file always win.
+    """
+    parsed_rows = derive_fields(descriptions, [v.get('item_size') for v in values])
+    for row, parsed in zip(values, parsed_rows):
+        for field, parsed_value in parsed.items():
+            if parsed_value and _empty(row.get(field)):
+                row[field] = parsed_value
+    return values
+
+
+def reparse_catalog(chunk_size=2000, overwrite=False):
+    """
+    Re-derive group / MRP / units for the whole catalog.
+
+    Rows are read in id order `chunk_size` at a time (keyset, so memory stays
+    flat) and every changed row of a chunk is written by one executemany
+    UPDATE, committed per chunk. By default only empty fields are filled;
+    with `overwrite` any field the parser can derive is replaced.
+    Returns {"scanned": n, "updated": n}.
+    """
+    table = Item.__table__
+    cols = [table.c.id, table.c.description, table.c.item_size] + [table.c[f] for f in DERIVED_FIELDS]
+    stmt = update(table).where(table.c.id == bindparam('_id')).values(
+        last_updated=bindparam('_now'), **{f: bindparam(f'_{f}') for f in DERIVED_FIELDS})
+    scanned = updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*cols).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        scanned += len(rows)
+        now = datetime.utcnow()
+        params = []
+        for row, parsed in zip(rows, derive_fields([r.description for r in rows], [r.item_size for r in rows])):
+            new = {}
+            changed = False
+            for field in DERIVED_FIELDS:
+                current, value = getattr(row, field), parsed[field]
+                if value and (overwrite or _empty(current)) and value != current:
+                    new[f'_{field}'] = value
+                    changed = True
+                else:
+                    new[f'_{field}'] = current
+            if changed:
+                new['_id'] = row.id
+                new['_now'] = now
+                params.append(new)
+        if params:
+            db.session.execute(stmt, params)
+            updated += len(params)
+        db.session.commit()
+    return {"scanned": scanned, "updated": updated}
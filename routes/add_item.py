@@ -1,8 +1,10 @@
 # routes/add_item.py
 from flask import Blueprint, render_template, request, redirect, flash, url_for, current_app
 from extensions import db
-from models import Item
-from sqlalchemy import func
+from models import Item, normalize_description
+from parsing import extract_group, extract_mrp, extract_item_size
+from serializers import json_response
+from suggest import suggest_index
 import re
 from datetime import datetime
 
@@ -32,46 +34,6 @@ def safe_float(v, default=0.0):
     except Exception:
         return default
 
-def extract_group(desc):
-    if not desc:
-        return ''
-    m = re.search(r'\(([^)]+)\)', desc)
-    return m.group(1).strip() if m else ''
-
-def extract_mrp(desc):
-    """
-    Only take a number that directly prefixes a '/' or '/-' token.
-    Example matches: '500/-', '500 / -', '500 /'
-    Will NOT match '20ML' or numbers followed by letters.
-    """
-    if not desc:
-        return 0
-    m = re.search(r'(\d+(?:\.\d+)?)(?=\s*(?:\/-|\//|\/))', desc)
-    if m:
-        try:
-            return int(float(m.group(1)))
-        except Exception:
-            return 0
-    return 0
-
-def extract_item_size(size):
-    """
-    Parse strings like '1CTN=20PKD' or '1 CTN = 20 PKD'
-    Returns (main_unit, alt_unit, alt_qty) or ('','',0)
-    """
-    if not size:
-        return ('', '', 0)
-    s = size.strip()
-    m = re.search(r'(\d+)\s*([A-Za-z]+)\s*=\s*(\d+)\s*([A-Za-z]+)', s, flags=re.I)
-    if m:
-        left_qty = int(m.group(1))
-        main_unit = m.group(2).upper()
-        right_qty = int(m.group(3))
-        alt_unit = m.group(4).upper()
-        return (main_unit, alt_unit, right_qty)
-    return ('', '', 0)
-
-
 @add_item_bp.route('/', methods=['GET', 'POST'])
 @add_item_bp.route('/add', methods=['GET', 'POST'])
 def add_item():
@@ -146,10 +108,10 @@ def add_item():
             if '/' not in desc and not mrp_form_raw:
                 mrp_val = 0
 
-            # Check for duplicate description (case-insensitive)
+            # Check for duplicate description (case/whitespace-insensitive, via the indexed key)
             if desc:
                 # When editing, exclude current item from duplicate check
-                duplicate_query = Item.query.filter(func.lower(Item.description) == func.lower(desc))
+                duplicate_query = Item.query.filter(Item.description_key == normalize_description(desc))
                 if item_id:
                     duplicate_query = duplicate_query.filter(Item.id != int(item_id))
 
@@ -201,3 +163,11 @@ def add_item():
             item = None
 
     return render_template('add_item.html', item=item)
+
+
+@add_item_bp.route('/api/suggest')
+def suggest():
+    """Typeahead for the description field: prefix matches plus an exact-duplicate flag."""
+    limit = request.args.get('limit', type=int)
+    exclude = request.args.get('exclude', type=int)
+    return json_response(suggest_index.suggest(request.args.get('q', ''), limit=limit, exclude_id=exclude))
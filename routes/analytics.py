@@ -0,0 +1,22 @@
+# routes/analytics.py
+from flask import Blueprint, request, jsonify
+from analytics import DIMENSIONS, summaries
+from routes.records import conditional_on_catalog
+from serializers import json_response
+
+analytics_bp = Blueprint('analytics', __name__)
+
+
+@analytics_bp.route('/api/analytics', methods=['GET'])
+@conditional_on_catalog
+def api_analytics():
+    """
+    Inventory summaries per group and per supplier: item counts, average /
+    min / max sale margin and average purchase and sale price.
+    ?by=group or ?by=supplier returns one dimension only.
+    """
+    by = request.args.get('by', '').strip()
+    if by and by not in DIMENSIONS:
+        return jsonify({"success": False, "message": f'by must be one of {", ".join(DIMENSIONS)}'}), 400
+    dims = [by] if by else list(DIMENSIONS)
+    return json_response({f"{dim}s": summaries(dim) for dim in dims})
@@ -0,0 +1,378 @@
+# routes/batch.py
+import math
+from flask import Blueprint, request, jsonify, current_app
+from changes import compact_after_write
+from extensions import db
+from models import Item, apply_item_defaults, normalize_description
+from importer import existing_description_keys
+from schema import deferred_insert_triggers
+from search import apply_search
+from sqlalchemy import func, case, select, or_
+from datetime import datetime
+
+batch_bp = Blueprint('batch', __name__)
+
+INT_FIELDS = ('mrp', 'alt_qty')
+FLOAT_FIELDS = ('purc_price', 'bulk_sp1', 'bulk_sp2', 'sale_price')
+TEXT_FIELDS = ('description', 'item_group', 'item_size', 'main_unit', 'alt_unit', 'supplier')
+EDITABLE_FIELDS = TEXT_FIELDS + INT_FIELDS + FLOAT_FIELDS
+
+# chunk size for id IN (...) lists, well under SQLite's bound-parameter limit
+ID_CHUNK = 500
+
+
+def _coerce(payload):
+    """
+    Pick the editable fields out of one JSON object and coerce their types.
+    Returns (values, errors); unknown keys other than 'id' are reported.
+    """
+    values, errors = {}, []
+    for key, raw in payload.items():
+        if key == 'id':
+            continue
+        if key not in EDITABLE_FIELDS:
+            errors.append(f'Unknown field "{key}"')
+            continue
+        if raw is None:
+            values[key] = None
+        elif key in TEXT_FIELDS:
+            values[key] = str(raw).strip()
+        elif isinstance(raw, bool):
+            errors.append(f'{key} must be a number')
+        else:
+            try:
+                num = float(str(raw).replace(',', '').strip())
+            except ValueError:
+                errors.append(f'{key} must be a number')
+                continue
+            if not math.isfinite(num):
+                errors.append(f'{key} must be a finite number')
+                continue
+            values[key] = int(num) if key in INT_FIELDS else round(num, 2)
+    return values, errors
+
+
+def _items_payload(key):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get(key), list):
+        return None, (jsonify({"success": False, "message": f'Expected a JSON object with a "{key}" list.'}), 400)
+    entries = data[key]
+    limit = current_app.config.get('BATCH_MAX_ITEMS', 1000)
+    if len(entries) > limit:
+        return None, (jsonify({"success": False, "message": f"At most {limit} entries per request."}), 413)
+    return entries, None
+
+
+def _rejected(errors):
+    return jsonify({
+        "success": False,
+        "message": f"{len(errors)} item(s) failed validation; nothing was saved.",
+        "errors": errors
+    }), 400
+
+
+def _load_items(ids):
+    found = {}
+    for start in range(0, len(ids), ID_CHUNK):
+        for item in Item.query.filter(Item.id.in_(ids[start:start + ID_CHUNK])):
+            found[item.id] = item
+    return found
+
+
+@batch_bp.route('/api/items/batch', methods=['POST'])
+def batch_create():
+    """
+    Create many items in one transaction: {"items": [{...}, ...]}.
+    Either every item is saved or none is; per-item errors come from Item.validate().
+    """
+    entries, error = _items_payload('items')
+    if error:
+        return error
+
+    rows, errors, keys = [], [], {}
+    for idx, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({"index": idx, "errors": ["Expected an object"]})
+            continue
+        values, problems = _coerce(entry)
+        problems += Item.validate_values(values)
+        key = normalize_description(values.get('description'))
+        if key and key in keys:
+            problems.append(f'Duplicate of entry {keys[key]} in this request')
+        elif key:
+            keys[key] = idx
+        if problems:
+            errors.append({"index": idx, "errors": problems})
+            continue
+        # omitted fields get the column defaults, as an ORM insert would
+        row = apply_item_defaults({f: values.get(f) for f in EDITABLE_FIELDS})
+        row['description_key'] = key
+        rows.append((idx, row))
+
+    for key in existing_description_keys(keys):
+        errors.append({"index": keys[key], "errors": ["An item with this description already exists"]})
+    if errors:
+        return _rejected(sorted(errors, key=lambda e: e["index"]))
+
+    if not rows:
+        # nothing to write: don't open a write transaction or move the catalog version
+        return jsonify({"success": True, "created": 0, "ids": []}), 201
+
+    try:
+        table = Item.__table__
+        # one executemany INSERT ... RETURNING id, ids come back in request order
+        stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+        with deferred_insert_triggers(db.session):
+            ids = list(db.session.scalars(stmt, [row for _, row in rows]))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Batch create failed")
+        return jsonify({"success": False, "message": str(getattr(e, 'orig', e))}), 500
+
+    compact_after_write()
+    return jsonify({"success": True, "created": len(ids), "ids": ids}), 201
+
+
+@batch_bp.route('/api/items/batch', methods=['PATCH'])
+def batch_update():
+    """
+    Partially update many items in one transaction: {"items": [{"id": 1, "sale_price": 40}, ...]}.
+    Only the supplied fields are written.
+    """
+    entries, error = _items_payload('items')
+    if error:
+        return error
+
+    errors, wanted = [], []
+    for idx, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not isinstance(entry.get('id'), int) or isinstance(entry.get('id'), bool):
+            errors.append({"index": idx, "errors": ['Each entry needs an integer "id"']})
+            continue
+        wanted.append((idx, entry))
+
+    items = _load_items([entry['id'] for _, entry in wanted])
+    changed, new_keys, index_of = [], {}, {}
+    for idx, entry in wanted:
+        item = items.get(entry['id'])
+        if item is None:
+            errors.append({"index": idx, "id": entry['id'], "errors": ["Item not found"]})
+            continue
+        index_of[item.id] = idx
+        values, problems = _coerce(entry)
+        for field, value in values.items():
+            setattr(item, field, value)
+        problems += item.validate()
+        if 'description' in values and item.description_key:
+            if item.description_key in new_keys and new_keys[item.description_key] != item.id:
+                problems.append('Duplicate description within this request')
+            new_keys[item.description_key] = item.id
+        if problems:
+            errors.append({"index": idx, "id": item.id, "errors": problems})
+        else:
+            changed.append(item)
+
+    if new_keys:
+        # a new key clashes with any other item holding it, unless that item is
+        # itself being renamed in this request
+        renamed = set(new_keys.values())
+        keys = list(new_keys)
+        with db.session.no_autoflush:
+            for start in range(0, len(keys), ID_CHUNK):
+                clashes = db.session.query(Item.id, Item.description_key) \
+                    .filter(Item.description_key.in_(keys[start:start + ID_CHUNK])).all()
+                for other_id, key in clashes:
+                    if other_id != new_keys[key] and other_id not in renamed:
+                        errors.append({"index": index_of[new_keys[key]], "id": new_keys[key],
+                                       "errors": ["An item with this description already exists"]})
+
+    if errors:
+        db.session.rollback()
+        return _rejected(sorted(errors, key=lambda e: e["index"]))
+
+    try:
+        if new_keys:
+            # the flush writes rows one at a time, so two items swapping
+            # descriptions would hit the unique key mid-flush: clear the
+            # changing keys first, then set the new ones
+            for item_id in new_keys.values():
+                items[item_id].description_key = None
+            db.session.flush()
+            for key, item_id in new_keys.items():
+                items[item_id].description_key = key
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Batch update failed")
+        return jsonify({"success": False, "message": str(getattr(e, 'orig', e))}), 500
+
+    compact_after_write()
+    return jsonify({"success": True, "updated": len(changed), "ids": [i.id for i in changed]})
+
+
+@batch_bp.route('/api/items/batch/delete', methods=['POST'])
+def batch_delete():
+    """Delete a list of ids in one statement and one commit: {"ids": [1, 2, 3]}."""
+    ids, error = _items_payload('ids')
+    if error:
+        return error
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return jsonify({"success": False, "message": '"ids" must be a list of integers.'}), 400
+
+    ids = list(dict.fromkeys(ids))
+    try:
+        deleted = 0
+        for start in range(0, len(ids), ID_CHUNK):
+            deleted += Item.query.filter(Item.id.in_(ids[start:start + ID_CHUNK])) \
+                .delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Batch delete failed")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    compact_after_write()
+    return jsonify({"success": True, "deleted": deleted, "missing": len(ids) - deleted})
+
+
+PRICE_FIELDS = FLOAT_FIELDS
+SELL_FIELDS = ('bulk_sp1', 'bulk_sp2', 'sale_price')
+REPRICE_MODES = ('percent', 'absolute', 'margin')
+REPRICE_TARGETS = ('group', 'supplier', 'q')
+REPRICE_PREVIEW_MAX = 500
+# larger results are Infinity in SQLite
+MAX_PRICE = 1e300
+
+
+def _reprice_targets(target):
+    """Ids selected by group / supplier / search query, as a subquery."""
+    query = apply_search(Item.query, target['q'], ranked=False)
+    if target['group']:
+        query = query.filter(Item.item_group == target['group'])
+    if target['supplier']:
+        query = query.filter(Item.supplier == target['supplier'])
+    return query.with_entities(Item.id).subquery()
+
+
+def _reprice_expr(field, mode, value):
+    """SQL expression for the new value of one price column; `value` must be finite."""
+    if not math.isfinite(value):
+        raise ValueError('reprice value must be a finite number')
+    col = getattr(Item, field)
+    if mode == 'percent':
+        return func.round(col * (1 + value / 100.0), 2)
+    if mode == 'absolute':
+        return func.round(col + value, 2)
+    # target margin over purchase price; items without a purchase price keep their price
+    return case(
+        (Item.purc_price > 0, func.round(Item.purc_price * (1 + value / 100.0), 2)),
+        else_=col
+    )
+
+
+def _margin_expr(sell, purc):
+    return case((purc > 0, func.round((sell - purc) * 100.0 / purc, 2)), else_=0)
+
+
+@batch_bp.route('/api/items/reprice', methods=['POST'])
+def reprice():
+    """
+    Reprice the items matching a target with one UPDATE statement.
+
+    {"target": {"group": ..., "supplier": ..., "q": ...},
+     "columns": ["sale_price", ...], "mode": "percent" | "absolute" | "margin",
+     "value": 5, "dry_run": true}
+
+    percent/absolute change each column from its own current value; margin sets
+    the sell columns to purc_price * (1 + value/100). A dry run returns the
+    affected count and a preview of new prices and margins without writing.
+    """
+    data = request.get_json(silent=True) or {}
+    target = data.get('target') or {}
+    columns = data.get('columns') or []
+    mode = data.get('mode')
+    problems = []
+    if not isinstance(target, dict):
+        target = {}
+    target = {k: str(target.get(k) or '').strip() for k in REPRICE_TARGETS}
+    if not any(target.values()):
+        problems.append('target needs at least one of "group", "supplier" or "q"')
+    if mode not in REPRICE_MODES:
+        problems.append(f'mode must be one of {", ".join(REPRICE_MODES)}')
+    allowed = SELL_FIELDS if mode == 'margin' else PRICE_FIELDS
+    if not columns or not isinstance(columns, list) or any(c not in allowed for c in columns):
+        problems.append(f'columns must be a non-empty list drawn from {", ".join(allowed)}')
+    try:
+        value = float(data.get('value'))
+    except (TypeError, ValueError):
+        problems.append('value must be a number')
+    else:
+        # JSON NaN binds as NULL in SQLite and would slip past the negative-price check
+        if not math.isfinite(value):
+            problems.append('value must be a finite number')
+    if problems:
+        return jsonify({"success": False, "message": "; ".join(problems)}), 400
+
+    columns = list(dict.fromkeys(columns))
+    ids = _reprice_targets(target)
+    selected = Item.query.filter(Item.id.in_(select(ids.c.id)))
+    new_values = {c: _reprice_expr(c, mode, value) for c in columns}
+
+    # the CheckConstraints forbid negative prices: refuse rather than clamp;
+    # a NULL or overflowing result would slip past them, so refuse those too
+    negative, invalid = {}, {}
+    for c, expr in new_values.items():
+        n = selected.filter(expr < 0).count()
+        if n:
+            negative[c] = n
+        n = selected.filter(getattr(Item, c).isnot(None), or_(expr.is_(None), expr > MAX_PRICE)).count()
+        if n:
+            invalid[c] = n
+    affected = selected.count()
+
+    if data.get('dry_run'):
+        new_purc = new_values.get('purc_price', Item.purc_price)
+        preview_cols = [Item.id, Item.description, Item.purc_price, *(getattr(Item, c) for c in SELL_FIELDS)]
+        preview_cols += [new_values[c].label(f'new_{c}') for c in columns]
+        preview_cols += [
+            _margin_expr(new_values.get(c, getattr(Item, c)), new_purc).label(f'new_margin_{c}')
+            for c in SELL_FIELDS
+        ]
+        try:
+            limit = max(1, min(int(data.get('preview_limit') or 50), REPRICE_PREVIEW_MAX))
+        except (TypeError, ValueError):
+            limit = 50
+        rows = selected.with_entities(*preview_cols).order_by(Item.id.desc()).limit(limit).all()
+        return jsonify({
+            "success": not negative and not invalid,
+            "dry_run": True,
+            "affected": affected,
+            "negative": negative,
+            "invalid": invalid,
+            "preview": [dict(r._mapping) for r in rows]
+        })
+
+    if negative:
+        return jsonify({
+            "success": False,
+            "message": "Repricing would make some prices negative; nothing was changed.",
+            "negative": negative
+        }), 400
+    if invalid:
+        return jsonify({
+            "success": False,
+            "message": "Repricing would make some prices empty or out of range; nothing was changed.",
+            "invalid": invalid
+        }), 400
+
+    try:
+        new_values['last_updated'] = datetime.utcnow()
+        updated = selected.update(new_values, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Reprice failed")
+        return jsonify({"success": False, "message": str(getattr(e, 'orig', e))}), 500
+
+    compact_after_write()
+    return jsonify({"success": True, "updated": updated})
@@ -0,0 +1,36 @@
+# routes/changes.py
+from flask import Blueprint, current_app, request, jsonify
+from changes import TokenExpired, changes_enabled, changes_since
+from routes.records import conditional_on_catalog
+from serializers import json_response, rows_to_dicts
+
+changes_bp = Blueprint('changes', __name__)
+
+
+@changes_bp.route('/api/changes', methods=['GET'])
+@conditional_on_catalog
+def api_changes():
+    """
+    Items changed since a sync token: {token, has_more, upserts, deleted}.
+    Start with since=0 (a full sync), then pass back the returned token;
+    keep going while has_more is true. 410 means the token is too old and
+    the client has to resync from since=0.
+    """
+    if not changes_enabled():
+        return jsonify({"success": False, "message": "Delta sync needs the SQLite change log."}), 501
+    config = current_app.config
+    limit = request.args.get('limit', type=int) or config.get('CHANGES_PAGE_SIZE', 1000)
+    limit = max(1, min(limit, config.get('CHANGES_MAX_PAGE_SIZE', 5000)))
+
+    try:
+        upserts, deleted, token, has_more = changes_since(request.args.get('since'), limit)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except TokenExpired as e:
+        return jsonify({"success": False, "message": str(e), "reset": True}), 410
+    return json_response({
+        "token": token,
+        "has_more": has_more,
+        "upserts": rows_to_dicts(upserts),
+        "deleted": deleted,
+    })
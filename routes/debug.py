@@ -0,0 +1,33 @@
+# routes/debug.py
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, abort
+from serializers import json_response
+
+debug_bp = Blueprint('debug', __name__, url_prefix='/_debug')
+
+
+def _log():
+    log = current_app.extensions.get('slow_queries')
+    if log is None:
+        abort(404)
+    return log
+
+
+@debug_bp.route('/slow-queries', methods=['GET'])
+def slow_queries():
+    """Worst slow statements grouped by endpoint (dev mode only)."""
+    log = _log()
+    report = log.report()
+    if request.args.get('format') == 'json':
+        return json_response({"threshold_ms": log.threshold * 1000, "endpoints": report})
+    return render_template(
+        'slow_queries.html',
+        report=report,
+        threshold_ms=log.threshold * 1000,
+        recent=list(log.recent)[-20:][::-1]
+    )
+
+
+@debug_bp.route('/slow-queries/clear', methods=['POST'])
+def clear_slow_queries():
+    _log().clear()
+    return redirect(url_for('debug.slow_queries'))
@@ -1,69 +1,359 @@
 # routes/records.py
 from flask import (
     Blueprint, render_template, request, redirect, url_for, flash, jsonify,
-    current_app, Response
+    current_app, Response, stream_with_context, make_response, g
 )
 from extensions import db
 from models import Item
-import io
+from importer import ImportResult, UploadReadError, import_rows, read_upload, is_spreadsheet
+from dedup import NearDuplicateFinder
+from import_jobs import import_jobs, JobQueueFull
+from search import apply_search
+from catalog import group_counts, catalog_version
+from serializers import project, rows_to_dicts, format_ist, json_response, to_ist  # noqa: F401
+from metrics import server_timing
 import csv
-from datetime import datetime, timezone, timedelta
+import time
+import tempfile
+import threading
+import hashlib
+from functools import wraps
+from datetime import datetime
+from itertools import islice
 from sqlalchemy import func
-
-# try to use zoneinfo for accurate tz handling; fallback to fixed offset
-try:
-    from zoneinfo import ZoneInfo
-    KOLKATA_TZ = ZoneInfo('Asia/Kolkata')
-    def to_ist(dt):
-        if dt is None:
-            return None
-        if dt.tzinfo is None:
-            # assume stored in UTC if naive
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone(KOLKATA_TZ)
-except Exception:
-    IST_OFFSET = timedelta(hours=5, minutes=30)
-    def to_ist(dt):
-        if dt is None:
-            return None
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone(timezone(IST_OFFSET))
-
+from itsdangerous import URLSafeSerializer, BadSignature
 
 records_bp = Blueprint('records', __name__)
 
 
-def _build_query(q, group):
-    base = Item.query
-    if q:
-        like = f"%{q}%"
-        base = base.filter(
-            (Item.description.ilike(like)) |
-            (Item.supplier.ilike(like)) |
-            (Item.item_group.ilike(like))
-        )
+class MarginFilter:
+    """Range filter and/or sort on one stored margin column"""
+    FIELDS = {'sale': 'margin_sale', 'bsp1': 'margin_bsp1', 'bsp2': 'margin_bsp2'}
+
+    def __init__(self, field='sale', low=None, high=None, sort=None):
+        self.field = field
+        self.column = getattr(Item, self.FIELDS[field])
+        self.low = low
+        self.high = high
+        self.sort = sort  # 'asc', 'desc' or None
+
+    @property
+    def key(self):
+        return (self.column.key, self.low, self.high)
+
+    def to_args(self):
+        """Query args that reproduce this filter (pagination links, search form)"""
+        args = {'margin': self.field}
+        if self.low is not None:
+            args['margin_min'] = f'{self.low:g}'
+        if self.high is not None:
+            args['margin_max'] = f'{self.high:g}'
+        if self.sort:
+            args['sort'] = 'margin' if self.sort == 'asc' else '-margin'
+        return args
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Parse ?margin=sale|bsp1|bsp2&margin_min=&margin_max=&sort=margin|-margin.
+        Returns None when no margin argument is given; raises ValueError on bad input.
+        """
+        field = args.get('margin', 'sale').strip() or 'sale'
+        low, high = args.get('margin_min', '').strip(), args.get('margin_max', '').strip()
+        sort = args.get('sort', '').strip()
+        if field not in cls.FIELDS:
+            raise ValueError(f'margin must be one of {", ".join(cls.FIELDS)}')
+        if sort not in ('', 'margin', '-margin'):
+            raise ValueError('sort must be "margin" or "-margin"')
+        if not (low or high or sort or 'margin' in args):
+            return None
+        try:
+            low = float(low) if low else None
+            high = float(high) if high else None
+        except ValueError:
+            raise ValueError('margin_min and margin_max must be numbers')
+        return cls(field, low, high, {'margin': 'asc', '-margin': 'desc'}.get(sort))
+
+
+def _build_query(q, group, ranked=True, margin=None):
+    # full-text (FTS5, relevance-ordered) when available, LIKE scan otherwise;
+    # a margin sort replaces relevance as the primary order
+    if margin is not None and margin.sort:
+        ranked = False
+    base = apply_search(Item.query, q, ranked=ranked)
     if group:
         base = base.filter(Item.item_group == group)
+    if margin is not None:
+        if margin.low is not None:
+            base = base.filter(margin.column >= margin.low)
+        if margin.high is not None:
+            base = base.filter(margin.column < margin.high)
+        if margin.sort == 'asc':
+            base = base.order_by(margin.column.asc())
+        elif margin.sort == 'desc':
+            base = base.order_by(margin.column.desc())
     return base
 
 
+class KeysetPage:
+    """One page of a cursor walk over Item.id descending"""
+    def __init__(self, items, per_page, next_cursor, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+        self.total = total
+
+
+def _cursor_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='records-cursor')
+
+
+def _encode_cursor(last_id):
+    return _cursor_serializer().dumps({'id': last_id})
+
+
+def _decode_cursor(cursor):
+    """Return the last seen id, or raise BadSignature for a forged/garbled cursor."""
+    data = _cursor_serializer().loads(cursor)
+    if not isinstance(data, dict) or not isinstance(data.get('id'), int):
+        raise BadSignature('Malformed cursor')
+    return data['id']
+
+
+# (catalog version, q, group, margin) -> (expires_at, total); keeps COUNT(*) off the
+# hot path in cursor mode. Keying on the version means a write is reflected at
+# once instead of after the TTL (without a version, only the TTL applies).
+_count_cache = {}
+_count_lock = threading.Lock()
+COUNT_CACHE_SIZE = 256
+
+
+def _request_catalog_version():
+    """catalog_version() once per request (the ETag check usually read it already)."""
+    if 'catalog_version' not in g:
+        g.catalog_version = catalog_version()
+    return g.catalog_version
+
+
+def _cached_count(q, group, margin=None):
+    ttl = current_app.config.get('RECORDS_COUNT_CACHE_TTL', 30)
+    version = _request_catalog_version()
+    key = (version, q, group, margin.key if margin else None)
+    now = time.monotonic()
+    hit = _count_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    total = _build_query(q, group, ranked=False, margin=margin).order_by(None).count()
+    with _count_lock:
+        # entries for other versions can't be hit again once the catalog moved on
+        for k in [k for k, (expires, _) in _count_cache.items() if k[0] != version or expires <= now]:
+            del _count_cache[k]
+        while len(_count_cache) >= COUNT_CACHE_SIZE:
+            del _count_cache[next(iter(_count_cache))]
+        _count_cache[key] = (now + ttl, total)
+    return total
+
+
+def _keyset_page(q, group, cursor, per_page, with_total=False, margin=None):
+    """
+    Fetch the page after `cursor` using `WHERE id < :last ORDER BY id DESC LIMIT n`,
+    so every page costs the same however deep it is. No COUNT(*) unless asked for
+    (and then it is cached). Margin ranges apply; margin sorting does not.
+    """
+    query = _build_query(q, group, ranked=False, margin=margin).order_by(None)
+    if cursor:
+        query = query.filter(Item.id < _decode_cursor(cursor))
+    rows = project(query).order_by(Item.id.desc()).limit(per_page + 1).all()
+    next_cursor = _encode_cursor(rows[per_page - 1].id) if len(rows) > per_page else None
+    total = _cached_count(q, group, margin) if with_total else None
+    return KeysetPage(rows[:per_page], per_page, next_cursor, total)
+
+
+def _catalog_etag():
+    """ETag for the current request: catalog version + path + query args."""
+    if not current_app.config.get('CATALOG_ETAGS', True):
+        return None
+    version = _request_catalog_version()
+    if version is None:
+        return None
+    args = sorted(request.args.items(multi=True))
+    return hashlib.sha1(f"{version}|{request.path}|{args}".encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag):
+    """304 response when the client already holds `etag`, else None."""
+    if etag and etag in request.if_none_match:
+        resp = current_app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+    return None
+
+
+def _tag_response(resp, etag):
+    if etag and resp.status_code == 200:
+        resp.set_etag(etag)
+        # clients must revalidate, which is a cheap 304 while nothing changes
+        resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def conditional_on_catalog(view):
+    """Answer If-None-Match with 304 before running the view's query."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = _catalog_etag()
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        return _tag_response(make_response(view(*args, **kwargs)), etag)
+    return wrapper
+
+
 def _distinct_groups():
+    """(group, item_count) pairs from the trigger-maintained group catalog"""
     try:
-        rows = db.session.query(Item.item_group).filter(Item.item_group.isnot(None)).distinct().order_by(Item.item_group).all()
-        return [r[0] for r in rows if r[0] is not None and str(r[0]).strip() != ""]
+        return group_counts()
     except Exception:
         return []
 
 
+CSV_EXPORT_HEADER = [
+    "SN", "id", "description", "item_group", "mrp", "item_size",
+    "main_unit", "alt_unit", "alt_qty", "purc_price",
+    "bulk_sp1", "bulk_sp2", "sale_price", "supplier", "last_updated_ist"
+]
+
+
+class _LineBuffer:
+    """File-like sink for csv.writer that hands back each formatted line."""
+    def write(self, value):
+        return value
+
+
+def _iter_csv(query, chunk_size=500):
+    """
+    Yield the CSV export in chunks: BOM + header first, then one block of
+    lines per `chunk_size` projected rows fetched with yield_per, so memory
+    stays flat and the client gets the first byte immediately.
+    """
+    writer = csv.writer(_LineBuffer())
+    yield ('\ufeff' + writer.writerow(CSV_EXPORT_HEADER)).encode('utf-8')
+
+    rows = iter(project(query).yield_per(chunk_size))
+    sn = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        stamps = format_ist([r[-1] for r in chunk], display=True)
+        lines = []
+        for (item_id, desc, group, mrp, size, main, alt, alt_qty,
+             purc, bsp1, bsp2, sale, supplier, _), last_s in zip(chunk, stamps):
+            sn += 1
+            lines.append(writer.writerow([
+                sn,
+                item_id,
+                desc or '',
+                group or '',
+                (mrp if mrp is not None else ''),
+                size or '',
+                main or '',
+                alt or '',
+                (alt_qty if alt_qty is not None else ''),
+                (f"{purc:.2f}" if purc is not None else ''),
+                (f"{bsp1:.2f}" if bsp1 is not None else ''),
+                (f"{bsp2:.2f}" if bsp2 is not None else ''),
+                (f"{sale:.2f}" if sale is not None else ''),
+                supplier or '',
+                last_s
+            ]))
+        yield ''.join(lines).encode('utf-8')
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XLSX_PRICE_FORMAT = '0.00'
+XLSX_STAMP_FORMAT = 'dd-mm-yyyy hh:mm AM/PM'
+
+
+def _write_xlsx(query, out, chunk_size=500):
+    """
+    Write the export as an openpyxl write-only workbook into the binary file
+    `out`. Rows are fetched `chunk_size` at a time and serialized as they are
+    appended, so memory stays flat; numbers and the IST timestamp are typed
+    cells rather than text.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Items')
+    bold = Font(bold=True)
+    header = []
+    for name in CSV_EXPORT_HEADER:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    # one formatted cell per styled column, refilled for each row: append()
+    # writes the row out immediately, so the cells can be reused
+    prices = [WriteOnlyCell(ws) for _ in range(4)]
+    for cell in prices:
+        cell.number_format = XLSX_PRICE_FORMAT
+    stamp = WriteOnlyCell(ws)
+    stamp.number_format = XLSX_STAMP_FORMAT
+
+    rows = iter(project(query).yield_per(chunk_size))
+    sn = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        for (item_id, desc, group, mrp, size, main, alt, alt_qty,
+             purc, bsp1, bsp2, sale, supplier, last) in chunk:
+            sn += 1
+            for cell, value in zip(prices, (purc, bsp1, bsp2, sale)):
+                cell.value = value
+            # Excel has no time zones: store the IST wall-clock time
+            stamp.value = to_ist(last).replace(tzinfo=None) if last else None
+            # empty text becomes an empty cell (None), not an empty string cell
+            ws.append([sn, item_id, desc or None, group or None, mrp, size or None, main or None,
+                       alt or None, alt_qty, *prices, supplier or None, stamp])
+    wb.save(out)
+
+
+def _iter_file(f, block_size=64 * 1024):
+    """Stream a spooled file back to the client and close it afterwards."""
+    try:
+        f.seek(0)
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        f.close()
+
+
 @records_bp.route('/records', methods=['GET'])
 def records():
     q = request.args.get('q', '').strip()
     group_selected = request.args.get('group', '').strip()
     fmt = request.args.get('format', '').lower()
-
-    # CSV export (server-side)
-    if fmt == 'csv':
+    try:
+        margin = MarginFilter.from_args(request.args)
+    except ValueError as e:
+        flash(str(e), 'warning')
+        margin = None
+
+    # CSV / XLSX export (server-side)
+    if fmt in ('csv', 'xlsx'):
+        etag = _catalog_etag()
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
         try:
             ids_param = request.args.get('ids', '').strip()
             if ids_param:
@@ -73,53 +363,37 @@ def records():
                     id_list = []
                 query = Item.query.filter(Item.id.in_(id_list)).order_by(Item.id.desc())
             else:
-                query = _build_query(q, group_selected).order_by(Item.id.desc())
-
-            items = query.all()
-            output = io.StringIO(newline='')
-            writer = csv.writer(output)
-            writer.writerow([
-                "SN", "id", "description", "item_group", "mrp", "item_size",
-                "main_unit", "alt_unit", "alt_qty", "purc_price",
-                "bulk_sp1", "bulk_sp2", "sale_price", "supplier", "last_updated_ist"
-            ])
-            for idx, it in enumerate(items, start=1):
-                last = getattr(it, 'last_updated', None)
-                last_s = ''
-                if last:
-                    try:
-                        last_s = to_ist(last).strftime('%d-%m-%Y (%I:%M %p)')
-                    except Exception:
-                        last_s = last.isoformat(sep=' ')
-                writer.writerow([
-                    idx,
-                    it.id,
-                    it.description or '',
-                    it.item_group or '',
-                    (it.mrp if it.mrp is not None else ''),
-                    it.item_size or '',
-                    it.main_unit or '',
-                    it.alt_unit or '',
-                    (it.alt_qty if it.alt_qty is not None else ''),
-                    (f"{it.purc_price:.2f}" if it.purc_price is not None else ''),
-                    (f"{it.bulk_sp1:.2f}" if it.bulk_sp1 is not None else ''),
-                    (f"{it.bulk_sp2:.2f}" if it.bulk_sp2 is not None else ''),
-                    (f"{it.sale_price:.2f}" if it.sale_price is not None else ''),
-                    it.supplier or '',
-                    last_s
-                ])
-            csv_text = output.getvalue()
-            output.close()
-            csv_bytes = csv_text.encode('utf-8-sig')
-            filename = f"items_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-            return Response(
-                csv_bytes,
+                query = _build_query(q, group_selected, margin=margin).order_by(Item.id.desc())
+
+            chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 500)
+            filename = f"items_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+            if fmt == 'xlsx':
+                # the zip container needs the whole sheet before its first byte,
+                # so the workbook is spooled to a temp file and then streamed
+                spool = tempfile.TemporaryFile(dir=current_app.config.get('EXPORT_SPOOL_DIR'))
+                try:
+                    _write_xlsx(query, spool, chunk_size)
+                    size = spool.tell()
+                except BaseException:
+                    spool.close()
+                    raise
+                return _tag_response(Response(
+                    _iter_file(spool),
+                    mimetype=XLSX_MIMETYPE,
+                    headers={"Content-Disposition": f"attachment;filename={filename}",
+                             "Content-Length": str(size)}
+                ), etag)
+            return _tag_response(Response(
+                stream_with_context(_iter_csv(query, chunk_size)),
                 mimetype="text/csv; charset=utf-8",
-                headers={"Content-Disposition": f"attachment;filename={filename}", "Content-Length": str(len(csv_bytes))}
-            )
+                headers={"Content-Disposition": f"attachment;filename={filename}"}
+            ), etag)
+        except ImportError:
+            flash("Missing dependency openpyxl. Run: pip install openpyxl", "danger")
+            return redirect(url_for('records.records'))
         except Exception as e:
-            current_app.logger.exception("CSV export failed")
-            flash(f"Could not export CSV: {e}", "danger")
+            current_app.logger.exception("%s export failed", fmt.upper())
+            flash(f"Could not export {fmt.upper()}: {e}", "danger")
             return redirect(url_for('records.records'))
 
     # HTML listing with pagination
@@ -133,32 +407,43 @@ def records():
         per_page = 12
     per_page = max(5, min(per_page, 200))
 
-    query = _build_query(q, group_selected).order_by(Item.id.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    items = pagination.items
-
-    # Prepare IST display string for each item (server-side)
-    for it in items:
-        it.last_updated_ist = ''
-        if getattr(it, 'last_updated', None):
-            try:
-                dt_ist = to_ist(it.last_updated)
-                it.last_updated_ist = dt_ist.strftime('%d-%m-%Y (%I:%M %p)')
-            except Exception:
-                try:
-                    it.last_updated_ist = it.last_updated.isoformat(sep=' ')
-                except Exception:
-                    it.last_updated_ist = ''
-
-    groups = _distinct_groups()
+    # ?cursor= switches to keyset pagination (constant cost per page)
+    cursor_page = None
+    pagination = None
+    if 'cursor' in request.args:
+        if margin is not None and margin.sort:
+            # keyset pages walk id order; same rule as /api/records
+            flash('Sorting by margin is not available with cursor pagination; showing newest first.', 'warning')
+            margin.sort = None
+        try:
+            cursor_page = _keyset_page(q, group_selected, request.args.get('cursor', ''), per_page,
+                                       with_total=True, margin=margin)
+        except BadSignature:
+            flash('Invalid page cursor; showing the first page.', 'warning')
+            cursor_page = _keyset_page(q, group_selected, '', per_page, with_total=True, margin=margin)
+        rows = cursor_page.items
+    else:
+        query = project(_build_query(q, group_selected, margin=margin).order_by(Item.id.desc()))
+        with server_timing('paginate'):
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        rows = pagination.items
+
+    # plain dicts with the IST display string, formatted in one pass
+    with server_timing('serialize'):
+        items = rows_to_dicts(rows, timestamp_key='last_updated_ist', display=True)
+
+    with server_timing('groups'):
+        groups = _distinct_groups()
 
     return render_template(
         'records.html',
         items=items,
         q=q,
         pagination=pagination,
+        cursor_page=cursor_page,
         groups=groups,
-        group_selected=group_selected
+        group_selected=group_selected,
+        margin_args=margin.to_args() if margin is not None else {}
     )
 
 
@@ -168,185 +453,79 @@ def import_items():
     Accepts a file upload (CSV or XLSX). Expects headers or well-formed columns.
     Skips duplicates by matching normalized description (case-insensitive, whitespace-normalized).
     Returns JSON with counts: total, imported, skipped, errors (and example messages).
+
+    With `async=1` (form field or query arg) the file is spooled to disk and
+    imported in the background; the response is a job id to poll at
+    /records/import/<job_id>.
+
+    With `fuzzy=1` (or IMPORT_FUZZY_DEDUP) near-duplicates of catalog items
+    or earlier rows are listed under `near_duplicates` with their similarity.
     """
     file = request.files.get('file')
     if not file:
         return jsonify({"success": False, "message": "No file uploaded."}), 400
 
-    filename = file.filename or ''
-    lower = filename.lower()
-    rows = []
-    total = 0
-    imported = 0
-    skipped = 0
-    errors = 0
-    skipped_examples = []
-
-    # helper to normalize description for duplicate checks
-    def norm_desc(s):
-        if s is None:
-            return ''
-        return ' '.join(str(s).strip().split()).lower()
+    fuzzy = request.values.get('fuzzy')
+    if fuzzy is None:
+        fuzzy = current_app.config.get('IMPORT_FUZZY_DEDUP', False)
+    else:
+        fuzzy = fuzzy.lower() in ('1', 'true', 'yes')
 
+    run_async = (request.values.get('async') or '').lower() in ('1', 'true', 'yes')
+    if run_async:
+        try:
+            job = import_jobs.submit(file, fuzzy=fuzzy)
+        except JobQueueFull as e:
+            return jsonify({"success": False, "message": str(e)}), 503
+        except Exception as e:
+            current_app.logger.exception("Could not queue import")
+            return jsonify({"success": False, "message": f"Could not queue import: {e}"}), 500
+        return jsonify({
+            "success": True,
+            "job_id": job.id,
+            "status_url": url_for('records.import_status', job_id=job.id)
+        }), 202
+
+    # Rows are streamed from the upload one at a time; nothing below holds
+    # more than one batch of parsed rows in memory.
     try:
-        if lower.endswith('.xlsx') or lower.endswith('.xlsm') or lower.endswith('.xls'):
-            try:
-                import openpyxl
-            except Exception:
-                return jsonify({"success": False, "message": "Missing dependency openpyxl. Run: pip install openpyxl"}), 500
-            wb = openpyxl.load_workbook(file.stream, read_only=True, data_only=True)
-            ws = wb.active
-            data = list(ws.values)
-            if not data:
-                return jsonify({"success": False, "message": "Spreadsheet is empty."}), 400
-            header = [str(h).strip().lower() if h is not None else '' for h in data[0]]
-            for r in data[1:]:
-                row = {header[i]: (r[i] if i < len(r) else None) for i in range(len(header))}
-                rows.append(row)
-        else:
-            # assume CSV
-            # decode to text
-            txt = file.stream.read().decode('utf-8-sig')  # tolerate BOM
-            reader = csv.reader(io.StringIO(txt))
-            data = list(reader)
-            if not data:
-                return jsonify({"success": False, "message": "CSV is empty."}), 400
-            header = [h.strip().lower() for h in data[0]]
-            for r in data[1:]:
-                # map header to row values (safe)
-                row = {}
-                for i, h in enumerate(header):
-                    row[h] = r[i] if i < len(r) else None
-                rows.append(row)
+        header, raw_rows = read_upload(file.stream, file.filename)
+    except ImportError:
+        return jsonify({"success": False, "message": "Missing dependency openpyxl. Run: pip install openpyxl"}), 500
     except Exception as e:
         current_app.logger.exception("Import parse failed")
         return jsonify({"success": False, "message": f"Failed to read uploaded file: {e}"}), 400
+    if header is None:
+        msg = "Spreadsheet is empty." if is_spreadsheet(file.filename) else "CSV is empty."
+        return jsonify({"success": False, "message": msg}), 400
 
-    # Normalize header keys mapping to model fields we accept
-    # Accept common column names -> field names
-    key_map_candidates = {
-        'description': ['description', 'item description', 'name', 'item_name'],
-        'item_group': ['item_group', 'group', 'category'],
-        'mrp': ['mrp', 'price', 'mrp₹', 'mrp (₹)'],
-        'item_size': ['item_size', 'size'],
-        'main_unit': ['main_unit', 'main'],
-        'alt_unit': ['alt_unit', 'alt'],
-        'alt_qty': ['alt_qty','altqty','qty','quantity'],
-        'purc_price': ['purc_price','purchase','purchase_price','purc_price'],
-        'bulk_sp1': ['bulk_sp1','bsp1','bulk1'],
-        'bulk_sp2': ['bulk_sp2','bsp2','bulk2'],
-        'sale_price': ['sale_price','sale','selling_price'],
-        'supplier': ['supplier','vendor']
-    }
-
-    # Build reverse map header_key -> canonical field
-    header_to_field = {}
-    sample_headers = set()
-    if rows:
-        sample_headers = set(str(k).strip().lower() for k in rows[0].keys())
-
-    for field, cand in key_map_candidates.items():
-        for c in cand:
-            if c in sample_headers:
-                header_to_field[c] = field
-
-    # If header_to_field incomplete, try fuzzy: match by startswith/contains
-    for h in sample_headers:
-        if h in header_to_field:
-            continue
-        for field, cand in key_map_candidates.items():
-            for c in cand:
-                if c in h or h in c:
-                    header_to_field[h] = field
-                    break
-            if h in header_to_field:
-                break
-
-    # For rows without headers (if rows are lists), try positional mapping by assuming order:
-    # But in our implementation rows are dicts (from header), so skip positional.
-
-    # fetch existing descriptions set for duplicate detection (lowercased normalized)
-    existing = db.session.query(Item.id, Item.description).all()
-    existing_norm = {norm_desc(r[1]): r[0] for r in existing if r[1]}
-
-    # Process rows
-    new_items = []
-    for idx, r in enumerate(rows, start=1):
-        total += 1
-        try:
-            # pull values by mapped fields
-            def val_for(field):
-                # find header that maps to this field
-                for h, f in header_to_field.items():
-                    if f == field:
-                        v = r.get(h)
-                        return v
-                # fallback: try direct key equal to canonical name
-                return r.get(field) if isinstance(r, dict) else None
-
-            desc = val_for('description') or ''
-            desc_norm = norm_desc(desc)
-            # Skip empty description
-            if not desc_norm:
-                skipped += 1
-                skipped_examples.append(f"Row {idx}: empty description")
-                continue
-
-            # Duplicate check by normalized description
-            if desc_norm in existing_norm:
-                skipped += 1
-                skipped_examples.append(f"Row {idx}: duplicate '{desc}'")
-                continue
-
-            # parse numeric fields safely
-            def num(x):
-                if x is None or str(x).strip() == '':
-                    return None
-                try:
-                    return float(str(x).replace(',','').strip())
-                except Exception:
-                    return None
-
-            item = Item(
-                description=str(desc).strip(),
-                item_group=val_for('item_group') or '',
-                mrp=(lambda v: (int(v) if str(v).strip().isdigit() else float(v)) if v is not None and str(v).strip()!='' else None)(val_for('mrp')) if val_for('mrp') is not None else None,
-                item_size=(val_for('item_size') or '') ,
-                main_unit=(val_for('main_unit') or ''),
-                alt_unit=(val_for('alt_unit') or ''),
-                alt_qty=(int(num(val_for('alt_qty'))) if num(val_for('alt_qty')) is not None else None),
-                purc_price=(num(val_for('purc_price')) if val_for('purc_price') is not None else None),
-                bulk_sp1=(num(val_for('bulk_sp1')) if val_for('bulk_sp1') is not None else None),
-                bulk_sp2=(num(val_for('bulk_sp2')) if val_for('bulk_sp2') is not None else None),
-                sale_price=(num(val_for('sale_price')) if val_for('sale_price') is not None else None),
-                supplier=(val_for('supplier') or '')
-            )
-            db.session.add(item)
-            # track to existing_norm so subsequent rows in same import won't be duplicated
-            # (we don't have id until commit; use placeholder)
-            existing_norm[desc_norm] = None
-            new_items.append(item)
-            imported += 1
-        except Exception as ex:
-            errors += 1
-            current_app.logger.exception("Error importing row")
-            skipped_examples.append(f"Row {idx}: error {ex}")
-
+    result = ImportResult()
     try:
-        db.session.commit()
+        import_rows(
+            header, raw_rows, result=result,
+            batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000),
+            use_savepoints=current_app.config.get('IMPORT_USE_SAVEPOINTS', False),
+            near_duplicates=NearDuplicateFinder.from_config(current_app.config) if fuzzy else None
+        )
+    except UploadReadError as e:
+        current_app.logger.exception("Import parse failed")
+        return jsonify({
+            "success": False,
+            "message": f"Failed to read uploaded file after row {result.total}: {e} (imported {result.imported} rows before the error)"
+        }), 400
     except Exception as e:
         current_app.logger.exception("Commit failed")
-        db.session.rollback()
         return jsonify({"success": False, "message": f"DB commit failed: {e}"}), 500
 
-    return jsonify({
-        "success": True,
-        "total": total,
-        "imported": imported,
-        "skipped": skipped,
-        "errors": errors,
-        "skipped_examples": skipped_examples[:10]
-    })
+    return jsonify({"success": True, **result.to_dict()})
+
+
+@records_bp.route('/records/import/<job_id>', methods=['GET'])
+def import_status(job_id):
+    status = import_jobs.status(job_id)
+    if status is None:
+        return jsonify({"success": False, "message": "Import job not found."}), 404
+    return jsonify({"success": True, **status})
 
 
 @records_bp.route('/edit/<int:id>', methods=['GET'])
@@ -369,6 +548,7 @@ def delete_item(id):
 
 
 @records_bp.route('/api/records', methods=['GET'])
+@conditional_on_catalog
 def api_records():
     q = request.args.get('q', '').strip()
     try:
@@ -380,37 +560,38 @@ def api_records():
     except ValueError:
         per_page = 20
     per_page = max(1, min(per_page, 200))
-
-    query = _build_query(q, request.args.get('group', '').strip()).order_by(Item.id.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-
-    def row_to_dict(it):
-        last = getattr(it, 'last_updated', None)
-        last_s = None
-        if last:
-            try:
-                last_s = to_ist(last).isoformat(sep=' ')
-            except Exception:
-                last_s = last.isoformat(sep=' ')
-        return {
-            "id": it.id,
-            "description": it.description,
-            "item_group": it.item_group,
-            "mrp": it.mrp,
-            "item_size": it.item_size,
-            "main_unit": it.main_unit,
-            "alt_unit": it.alt_unit,
-            "alt_qty": it.alt_qty,
-            "purc_price": it.purc_price,
-            "bulk_sp1": it.bulk_sp1,
-            "bulk_sp2": it.bulk_sp2,
-            "sale_price": it.sale_price,
-            "supplier": it.supplier,
-            "last_updated": last_s
-        }
-
-    return jsonify({
-        "items": [row_to_dict(it) for it in pagination.items],
+    group = request.args.get('group', '').strip()
+    try:
+        margin = MarginFilter.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    # keyset mode: ?cursor= (empty for the first page), follow next_cursor
+    cursor_page = None
+    if 'cursor' in request.args:
+        if margin is not None and margin.sort:
+            return jsonify({"success": False, "message": "sort is not supported with cursor pagination"}), 400
+        with_total = request.args.get('with_total', '').lower() in ('1', 'true', 'yes')
+        try:
+            cursor_page = _keyset_page(q, group, request.args.get('cursor', ''), per_page, with_total, margin)
+        except BadSignature:
+            return jsonify({"success": False, "message": "Invalid cursor"}), 400
+    else:
+        query = project(_build_query(q, group, margin=margin).order_by(Item.id.desc()))
+        with server_timing('paginate'):
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+
+    if cursor_page is not None:
+        return json_response({
+            "items": rows_to_dicts(cursor_page.items),
+            "per_page": cursor_page.per_page,
+            "next_cursor": cursor_page.next_cursor,
+            "has_more": cursor_page.has_next,
+            "total": cursor_page.total
+        })
+
+    return json_response({
+        "items": rows_to_dicts(pagination.items),
         "page": pagination.page,
         "per_page": pagination.per_page,
         "total": pagination.total,
@@ -419,35 +600,14 @@ def api_records():
 
 
 @records_bp.route('/api/item/<int:id>', methods=['GET'])
+@conditional_on_catalog
 def api_get_item(id):
-    item = Item.query.get(id)
-    if not item:
+    row = project(Item.query.filter(Item.id == id)).first()
+    if not row:
         return jsonify({"success": False, "message": "Item not found"}), 404
-    last = getattr(item, 'last_updated', None)
-    last_s = None
-    if last:
-        try:
-            last_s = to_ist(last).isoformat(sep=' ')
-        except Exception:
-            last_s = last.isoformat(sep=' ')
-    return jsonify({
+    return json_response({
         "success": True,
-        "item": {
-            "id": item.id,
-            "description": item.description,
-            "item_group": item.item_group,
-            "mrp": item.mrp,
-            "item_size": item.item_size,
-            "main_unit": item.main_unit,
-            "alt_unit": item.alt_unit,
-            "alt_qty": item.alt_qty,
-            "purc_price": item.purc_price,
-            "bulk_sp1": item.bulk_sp1,
-            "bulk_sp2": item.bulk_sp2,
-            "sale_price": item.sale_price,
-            "supplier": item.supplier,
-            "last_updated": last_s
-        }
+        "item": rows_to_dicts([row])[0]
     })
 
 
@@ -0,0 +1,163 @@
+"""
+Additive schema upgrades for existing databases.
+
+`db.create_all()` creates missing tables but never alters existing ones, so
+columns and indexes added to the model after a database was created are
+applied here. Every step is idempotent and safe to run on each start.
+
+Also home of deferred_insert_triggers(), the bulk-insert path that replaces
+the per-row AFTER INSERT triggers of every derived table with one set-based
+statement each per batch.
+"""
+import re
+from contextlib import contextmanager
+from sqlalchemy import func, inspect, select, text
+from extensions import db
+from models import AppMeta, BULK_INSERT_KEY, Item, MARGIN_COLUMNS, margin_sql, normalize_description
+from search import FTS_BATCH_SQL, FTS_DDL, fts_installed, install_fts, rebuild_fts
+from catalog import (CATALOG_TRIGGERS, GROUP_CATALOG_BATCH_SQL, VERSION_BATCH_SQL, VERSION_TRIGGERS,
+                     catalog_enabled, install_group_catalog, install_catalog_version,
+                     rebuild_group_catalog, version_enabled)
+from analytics import SUMMARY_BATCH_SQL, SUMMARY_TRIGGERS, install_summaries, rebuild_summaries, summaries_enabled
+from dedup import SIGNATURE_TRIGGERS, install_signatures, sign_new_items
+from changes import CHANGE_BATCH_SQL, CHANGE_TRIGGERS, changes_enabled, install_change_log
+
+# bump when upgrade_schema() gains a step that the model/trigger DDL doesn't show
+SCHEMA_REVISION = 1
+
+
+def _columns(conn, table):
+    return {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def _create_indexes(conn, table, names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def backfill_description_keys(conn, chunk_size=1000):
+    """Fill description_key for rows that lack it; later duplicates stay NULL."""
+    seen = {r[0] for r in conn.execute(text(
+        "SELECT description_key FROM item WHERE description_key IS NOT NULL"))}
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, description FROM item "
+            "WHERE description_key IS NULL AND id > :last ORDER BY id LIMIT :n"
+        ), {"last": last_id, "n": chunk_size}).all()
+        if not rows:
+            break
+        updates = []
+        for item_id, desc in rows:
+            key = normalize_description(desc)
+            if key and key not in seen:
+                seen.add(key)
+                updates.append({"id": item_id, "key": key})
+        if updates:
+            conn.execute(text("UPDATE item SET description_key = :key WHERE id = :id"), updates)
+        last_id = rows[-1][0]
+
+
+def trigger_ddl():
+    """Every trigger / virtual table statement upgrade_schema() installs (for the startup fingerprint)."""
+    return [f'revision {SCHEMA_REVISION}', *FTS_DDL, *CATALOG_TRIGGERS.values(),
+            *VERSION_TRIGGERS.values(), *SUMMARY_TRIGGERS.values(), *SIGNATURE_TRIGGERS.values(),
+            *CHANGE_TRIGGERS.values()]
+
+
+def _replace_changed_triggers(conn):
+    """Re-create triggers whose stored definition differs from the current DDL."""
+    stored = dict(conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).all())
+    for ddl in trigger_ddl():
+        m = re.match(r'CREATE TRIGGER IF NOT EXISTS (\w+)', ddl)
+        if not m or m.group(1) not in stored:
+            continue
+        # SQLite stores the statement without IF NOT EXISTS
+        if stored[m.group(1)] != ddl.replace(' IF NOT EXISTS', '', 1):
+            conn.execute(text(f"DROP TRIGGER {m.group(1)}"))
+            conn.execute(text(ddl))
+
+
+def upgrade_schema():
+    """Bring an existing `item` table up to the current model and install triggers."""
+    with db.engine.begin() as conn:
+        cols = _columns(conn, 'item')
+        if 'description_key' not in cols:
+            conn.execute(text("ALTER TABLE item ADD COLUMN description_key VARCHAR(500)"))
+            backfill_description_keys(conn)
+        for name, price in MARGIN_COLUMNS.items():
+            if name not in cols:
+                # SQLite can only add VIRTUAL generated columns; they index the same way
+                kind = 'VIRTUAL' if conn.dialect.name == 'sqlite' else 'STORED'
+                conn.execute(text(
+                    f"ALTER TABLE item ADD COLUMN {name} FLOAT "
+                    f"GENERATED ALWAYS AS ({margin_sql(price)}) {kind}"))
+        _create_indexes(conn, Item.__table__, {
+            'ix_item_description_key', 'ix_item_margin_bsp1', 'ix_item_margin_bsp2',
+            'ix_item_margin_sale', 'ix_item_group_margin_sale', 'ix_item_supplier_margin_sale',
+        })
+        install_fts(conn)
+        install_group_catalog(conn)
+        if 'descriptions' not in _columns(conn, 'catalog_version'):
+            conn.execute(text("ALTER TABLE catalog_version ADD COLUMN descriptions INTEGER NOT NULL DEFAULT 0"))
+        install_catalog_version(conn)
+        install_summaries(conn)
+        install_signatures(conn)
+        install_change_log(conn)
+        if conn.dialect.name == 'sqlite':
+            _replace_changed_triggers(conn)
+
+
+def rebuild_derived():
+    """Recompute every trigger-maintained table from `item` (recovery; SQLite only)."""
+    rebuilt = []
+    with db.engine.begin() as conn:
+        if conn.dialect.name != 'sqlite':
+            return rebuilt
+        if install_fts(conn):
+            rebuild_fts(conn)
+            rebuilt.append('item_fts')
+        rebuild_group_catalog(conn)
+        rebuild_summaries(conn)
+        rebuilt += ['item_group_catalog', 'item_summary']
+    return rebuilt
+
+
+# derived table -> (maintained here?, statements that apply a bulk insert of the rows with id > :after)
+BATCH_MAINTENANCE = (
+    (fts_installed, FTS_BATCH_SQL),
+    (catalog_enabled, GROUP_CATALOG_BATCH_SQL),
+    (version_enabled, VERSION_BATCH_SQL),
+    (summaries_enabled, SUMMARY_BATCH_SQL),
+    (changes_enabled, CHANGE_BATCH_SQL),
+)
+
+
+@contextmanager
+def deferred_insert_triggers(session):
+    """
+    Bulk-insert block for `item` (SQLite): rows inserted inside it skip the
+    per-row AFTER INSERT triggers, and on exit the FTS index, group catalog,
+    catalog version, summaries and change log are brought up to date with one
+    statement each. The new rows' near-duplicate signatures are written too
+    (on every database). Runs in the caller's write transaction; the caller
+    commits (or rolls back, which undoes the whole batch including the flag).
+    """
+    if db.engine.dialect.name != 'sqlite':
+        after = session.execute(select(func.coalesce(func.max(Item.id), 0))).scalar()
+        yield
+        sign_new_items(after, session)
+        return
+    # resolved before the write transaction starts (first use reads sqlite_master)
+    statements = [sql for maintained, batch in BATCH_MAINTENANCE if maintained() for sql in batch]
+    meta = AppMeta.__table__
+    # the flag insert opens the write transaction, so no other writer can add
+    # rows between reading max(id) and the batch: new rows are exactly id > after
+    session.execute(meta.insert().values(key=BULK_INSERT_KEY, value='1'))
+    after = session.execute(select(func.coalesce(func.max(Item.id), 0))).scalar()
+    yield
+    for sql in statements:
+        session.execute(text(sql), {'after': after})
+    sign_new_items(after, session)
+    session.execute(meta.delete().where(meta.c.key == BULK_INSERT_KEY))
@@ -0,0 +1,135 @@
+"""
+Full-text search over item description, supplier and group.
+
+On SQLite builds with FTS5 an external-content `item_fts` table is kept in
+sync with `item` by triggers (so ORM saves and bulk Core inserts are both
+covered). Each query token is prefix-matched and results are ranked by bm25.
+Without FTS5 (or with SEARCH_BACKEND = 'like') the LIKE scan is used.
+"""
+import re
+from flask import current_app
+from sqlalchemy import func, literal_column, table, column, text
+from extensions import db
+from models import Item, ROW_TRIGGERS_ACTIVE
+
+
+FTS_TABLE = 'item_fts'
+# bm25 column weights: description, supplier, item_group
+FTS_WEIGHTS = (10.0, 2.0, 4.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, supplier, item_group,
+        content='item', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON item WHEN {ROW_TRIGGERS_ACTIVE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, supplier, item_group)
+        VALUES (new.id, new.description, new.supplier, new.item_group);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, supplier, item_group)
+        VALUES ('delete', old.id, old.description, old.supplier, old.item_group);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, supplier, item_group ON item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, supplier, item_group)
+        VALUES ('delete', old.id, old.description, old.supplier, old.item_group);
+        INSERT INTO {FTS_TABLE}(rowid, description, supplier, item_group)
+        VALUES (new.id, new.description, new.supplier, new.item_group);
+    END""",
+]
+
+# a deferred bulk insert indexes its rows in one statement
+FTS_BATCH_SQL = [
+    f"""INSERT INTO {FTS_TABLE}(rowid, description, supplier, item_group)
+        SELECT id, description, supplier, item_group FROM item WHERE id > :after""",
+]
+
+_fts_table = table(FTS_TABLE, column('rowid'))
+
+# engine -> bool, resolved once per engine
+_fts_state = {}
+
+
+def install_fts(conn):
+    """
+    Create the FTS5 index and its sync triggers (SQLite only).
+
+    Returns True when full-text search is available. A freshly created index
+    is populated from the existing rows.
+    """
+    if conn.dialect.name != 'sqlite':
+        return False
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": FTS_TABLE}).first()
+    try:
+        for ddl in FTS_DDL:
+            conn.execute(text(ddl))
+    except Exception:
+        # SQLite compiled without FTS5
+        return False
+    if not exists:
+        rebuild_fts(conn)
+    return True
+
+
+def rebuild_fts(conn):
+    """Re-index every row from the item table."""
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def fts_installed():
+    """True when the FTS index (and its triggers) exist, whatever SEARCH_BACKEND says."""
+    engine = db.engine
+    if engine not in _fts_state:
+        enabled = False
+        if engine.dialect.name == 'sqlite':
+            with engine.connect() as conn:
+                enabled = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"),
+                    {"n": FTS_TABLE}).first() is not None
+        _fts_state[engine] = enabled
+    return _fts_state[engine]
+
+
+def fts_enabled():
+    if current_app.config.get('SEARCH_BACKEND', 'auto') == 'like':
+        return False
+    return fts_installed()
+
+
+def match_expression(q):
+    """'colgate 200' -> '"colgate"* "200"*' (every token, any order, prefix match)."""
+    tokens = _TOKEN_RE.findall(q or '')
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def like_filter(query, q):
+    like = f"%{q}%"
+    return query.filter(
+        (Item.description.ilike(like)) |
+        (Item.supplier.ilike(like)) |
+        (Item.item_group.ilike(like))
+    )
+
+
+def apply_search(query, q, ranked=True):
+    """
+    Restrict `query` to items matching `q`.
+
+    With FTS5 the query is joined to the index and, when `ranked`, ordered by
+    relevance (callers' own order_by then acts as a tie-breaker); otherwise
+    falls back to the LIKE scan. Keyset pagination passes ranked=False since
+    it needs a strict id order.
+    """
+    if not q:
+        return query
+    expr = match_expression(q)
+    if not expr or not fts_enabled():
+        return like_filter(query, q)
+    fts = literal_column(FTS_TABLE)
+    query = query.join(_fts_table, _fts_table.c.rowid == Item.id).filter(fts.op('MATCH')(expr))
+    if ranked:
+        query = query.order_by(func.bm25(fts, *FTS_WEIGHTS))
+    return query
@@ -0,0 +1,92 @@
+"""
+Shared item serialization for listings, the item API and exports.
+
+Reads select only the Item columns as plain rows (no ORM hydration), format
+timestamps for a whole batch in one pass (repeated values are formatted once,
+which matters after bulk imports), and JSON goes through a single encoder.
+"""
+import json
+from datetime import timezone, timedelta
+from flask import current_app
+from models import Item
+
+# try to use zoneinfo for accurate tz handling; fallback to fixed offset
+try:
+    from zoneinfo import ZoneInfo
+    KOLKATA_TZ = ZoneInfo('Asia/Kolkata')
+    def to_ist(dt):
+        if dt is None:
+            return None
+        if dt.tzinfo is None:
+            # assume stored in UTC if naive
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(KOLKATA_TZ)
+except Exception:
+    IST_OFFSET = timedelta(hours=5, minutes=30)
+    def to_ist(dt):
+        if dt is None:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone(IST_OFFSET))
+
+
+DISPLAY_FORMAT = '%d-%m-%Y (%I:%M %p)'
+
+ITEM_FIELDS = (
+    'id', 'description', 'item_group', 'mrp', 'item_size', 'main_unit',
+    'alt_unit', 'alt_qty', 'purc_price', 'bulk_sp1', 'bulk_sp2', 'sale_price',
+    'supplier',
+)
+# projected columns; last_updated is always the final column of a row
+ITEM_COLUMNS = tuple(getattr(Item, f) for f in ITEM_FIELDS) + (Item.last_updated,)
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def project(query):
+    """Select only the serialized Item columns as plain rows."""
+    return query.with_entities(*ITEM_COLUMNS)
+
+
+def format_ist(values, display=False):
+    """
+    Format a batch of (naive UTC) datetimes as IST strings.
+
+    `display` gives the listing/CSV format ('' for missing), otherwise ISO with
+    a space separator (None for missing), as the JSON API returns.
+    """
+    memo = {}
+    missing = '' if display else None
+    out = []
+    append = out.append
+    for dt in values:
+        if dt is None:
+            append(missing)
+            continue
+        s = memo.get(dt)
+        if s is None:
+            try:
+                local = to_ist(dt)
+                s = local.strftime(DISPLAY_FORMAT) if display else local.isoformat(sep=' ')
+            except Exception:
+                s = dt.isoformat(sep=' ')
+            memo[dt] = s
+        append(s)
+    return out
+
+
+def rows_to_dicts(rows, timestamp_key='last_updated', display=False):
+    """Turn projected rows into dicts, with the formatted timestamp under `timestamp_key`."""
+    stamps = format_ist([r[-1] for r in rows], display)
+    out = []
+    for r, stamp in zip(rows, stamps):
+        d = dict(zip(ITEM_FIELDS, r))
+        d[timestamp_key] = stamp
+        out.append(d)
+    return out
+
+
+def json_response(payload, status=200):
+    return current_app.response_class(
+        _encoder.encode(payload), status=status, mimetype='application/json')
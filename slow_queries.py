@@ -0,0 +1,167 @@
+"""
+Slow-query log.
+
+Statements slower than SLOW_QUERY_MS (off unless set; 100 ms in development)
+are logged with, on SQLite, their EXPLAIN QUERY PLAN, and with their bound
+parameters only when SLOW_QUERY_LOG_PARAMS is on, since those carry customer
+data. Transaction control and PRAGMAs are not logged: a slow BEGIN IMMEDIATE
+is a wait for the write lock, not a slow query. A plan that scans the whole
+`item` table (rather than searching an index) is flagged. Entries are
+aggregated per (endpoint, statement) so the report page (/_debug/slow-queries,
+dev mode or SLOW_QUERY_REPORT) can list the worst offenders by endpoint.
+
+The timing listeners are only attached to Engine while at least one app has
+the log enabled, so with it off queries pay nothing for it.
+"""
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# "SCAN item" / "SCAN TABLE item" without an index; item_fts etc. don't match
+FULL_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?item\b(?! USING)')
+# statements that are logged and explained; BEGIN/COMMIT/PRAGMA/SAVEPOINT are not
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+MAX_PARAMS_CHARS = 500
+
+
+class SlowQueryLog:
+    """Recent slow statements plus per-(endpoint, statement) aggregates for one app."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=200)
+        self.offenders = {}  # (endpoint, statement) -> aggregate dict
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.threshold = app.config.get('SLOW_QUERY_MS')
+        if not self.threshold:
+            _enabled_apps.discard(app)
+            _sync_listeners()
+            return
+        self.threshold /= 1000.0
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+        self.log_params = app.config.get('SLOW_QUERY_LOG_PARAMS', False)
+        self.recent = deque(maxlen=app.config.get('SLOW_QUERY_LOG_SIZE', 200))
+        app.extensions['slow_queries'] = self
+        _enabled_apps.add(app)
+        _sync_listeners()
+
+    def record(self, conn, statement, parameters, executemany, elapsed):
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        endpoint = 'background'
+        if has_request_context():
+            endpoint = request.endpoint or request.path
+        params = parameters[0] if executemany and parameters else parameters
+        plan = self._explain(conn, statement, params) if self.explain else []
+        full_scan = any(FULL_SCAN_RE.search(line) for line in plan)
+        shown = _short(params) if self.log_params else 'not logged'
+        entry = {
+            'endpoint': endpoint,
+            'statement': statement,
+            'parameters': shown + (f' (x{len(parameters)})' if executemany else ''),
+            'ms': round(elapsed * 1000, 2),
+            'plan': plan,
+            'full_scan': full_scan,
+            'at': time.time(),
+        }
+        with self._lock:
+            self.recent.append(entry)
+            agg = self.offenders.get((endpoint, statement))
+            if agg is None:
+                agg = self.offenders[(endpoint, statement)] = {
+                    'endpoint': endpoint, 'statement': statement, 'count': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0,
+                }
+            agg['count'] += 1
+            agg['total_ms'] = round(agg['total_ms'] + entry['ms'], 2)
+            agg['max_ms'] = max(agg['max_ms'], entry['ms'])
+            agg.update(parameters=entry['parameters'], plan=plan, full_scan=full_scan)
+        current_app.logger.warning(
+            "Slow query %.1f ms [%s]%s: %s | params=%s | plan=%s",
+            entry['ms'], endpoint, ' FULL SCAN of item' if full_scan else '',
+            ' '.join(statement.split()), entry['parameters'], '; '.join(plan))
+
+    def _explain(self, conn, statement, params):
+        if conn.dialect.name != 'sqlite':
+            return []
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute('EXPLAIN QUERY PLAN ' + statement, params or ())
+                return [row[-1] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception:
+            return []
+
+    def report(self, limit=20):
+        """{endpoint: [worst statements by total time]}, endpoints by total time."""
+        with self._lock:
+            rows = [dict(v) for v in self.offenders.values()]
+        by_endpoint = {}
+        for row in sorted(rows, key=lambda r: r['total_ms'], reverse=True):
+            by_endpoint.setdefault(row['endpoint'], []).append(row)
+        ordered = sorted(by_endpoint.items(), key=lambda kv: sum(r['total_ms'] for r in kv[1]), reverse=True)
+        return {endpoint: stmts[:limit] for endpoint, stmts in ordered}
+
+    def clear(self):
+        with self._lock:
+            self.recent.clear()
+            self.offenders.clear()
+
+
+def _short(params):
+    text = repr(params)
+    return text if len(text) <= MAX_PARAMS_CHARS else text[:MAX_PARAMS_CHARS] + '...'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get('slow_query_started')
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    if not has_app_context():
+        return
+    log = current_app.extensions.get('slow_queries')
+    if log is not None and elapsed >= log.threshold:
+        log.record(conn, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('slow_query_started'):
+        conn.info['slow_query_started'].pop()
+
+
+_LISTENERS = (
+    ('before_cursor_execute', _before_cursor_execute),
+    ('after_cursor_execute', _after_cursor_execute),
+    ('handle_error', _handle_error),
+)
+# apps with the log enabled; the listeners stay attached while this is non-empty
+_enabled_apps = weakref.WeakSet()
+
+
+def _sync_listeners():
+    """Attach the Engine listeners when some app has the log on, detach them when none does."""
+    wanted = bool(_enabled_apps)
+    for name, fn in _LISTENERS:
+        if wanted and not event.contains(Engine, name, fn):
+            event.listen(Engine, name, fn)
+        elif not wanted and event.contains(Engine, name, fn):
+            event.remove(Engine, name, fn)
+
+
+slow_queries = SlowQueryLog()
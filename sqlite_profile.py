@@ -0,0 +1,89 @@
+"""
+Production profile for file-backed SQLite.
+
+When SQLITE_PROFILE is on, every connection gets the SQLITE_PRAGMAS on connect
+(WAL, synchronous, cache_size, mmap_size, busy_timeout) and writes go through
+a separate single-connection engine:
+
+- reads use the normal pool and, under WAL, never wait for a writer;
+- a session switches to the write engine on its first flush or INSERT /
+  UPDATE / DELETE and stays there until commit or rollback, so it still reads
+  its own uncommitted rows;
+- the write engine's pool holds one connection, which queues writers inside
+  a process, and opens transactions with BEGIN IMMEDIATE so writers in other
+  processes wait on busy_timeout instead of failing with "database is locked".
+"""
+from flask import current_app, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.dml import UpdateBase
+
+
+def _apply_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def _begin_immediate(engine):
+    # take the write lock at BEGIN rather than on the first write, so a
+    # transaction never has to upgrade its lock (which busy_timeout can't retry)
+    @event.listens_for(engine, 'connect')
+    def disable_pysqlite_begin(dbapi_conn, record):
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _is_file_database(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:')
+
+
+def init_sqlite_profile(app, db):
+    """
+    Apply the profile to the app's engine and create the write engine.
+    Must run inside an app context, before the first connection is made.
+    """
+    if not app.config.get('SQLITE_PROFILE'):
+        return None
+    engine = db.engine
+    if not _is_file_database(engine):
+        app.logger.warning("SQLITE_PROFILE ignored: needs a file-backed SQLite database")
+        return None
+
+    pragmas = app.config.get('SQLITE_PRAGMAS', {})
+    _apply_pragmas(engine, pragmas)
+    writer = create_engine(
+        engine.url,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=app.config.get('SQLITE_WRITE_TIMEOUT', 30),
+        pool_pre_ping=True,
+    )
+    _apply_pragmas(writer, pragmas)
+    _begin_immediate(writer)
+    app.extensions['sqlite_writer'] = writer
+    return writer
+
+
+class RoutingSession(Session):
+    """db.session class: sends writes to the serialized write engine when one is configured."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        writer = current_app.extensions.get('sqlite_writer') if has_app_context() else None
+        if bind is None and writer is not None and (
+                self.info.get('writing') or self._flushing or isinstance(clause, UpdateBase)):
+            self.info['writing'] = True
+            return writer
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _end_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writing', None)
@@ -0,0 +1,98 @@
+"""
+Application startup: schema fingerprint, optional cache pre-warm and timing.
+
+`create_all()` plus `upgrade_schema()` reflect the database on every start.
+Instead, a fingerprint of the expected schema (table and index DDL plus the
+trigger definitions) is stored in `app_meta` once they have run, and later
+starts skip both while the fingerprint still matches. Set SCHEMA_CHECK =
+'always' to run them unconditionally.
+
+Each phase of create_app() is timed; the report is logged at startup, kept in
+app.extensions['startup'] and printed by `flask startup-report`.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable, CreateIndex
+from extensions import db
+
+SCHEMA_KEY = 'schema_fingerprint'
+
+
+class StartupTimer:
+    """Wall-clock time per named startup phase."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.notes = {}
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - t0) * 1000, 2)
+
+    def report(self):
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'phases_ms': dict(self.phases),
+            **self.notes,
+        }
+
+
+def schema_fingerprint(engine):
+    """Hash of the DDL the app expects, compiled for `engine`'s dialect."""
+    from schema import trigger_ddl
+    parts = []
+    for table in db.metadata.sorted_tables:
+        parts.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            parts.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+    parts += trigger_ddl()
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def stored_fingerprint(engine):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT value FROM app_meta WHERE key = :k"), {"k": SCHEMA_KEY}).scalar()
+    except Exception:
+        # no app_meta table yet
+        return None
+
+
+def ensure_schema(app):
+    """
+    Create / upgrade the schema unless the stored fingerprint matches.
+    Returns 'current' when the check was skipped, otherwise 'applied'.
+    """
+    from schema import upgrade_schema
+    from models import AppMeta
+
+    engine = db.engine
+    fingerprint = schema_fingerprint(engine)
+    if app.config.get('SCHEMA_CHECK', 'fingerprint') != 'always' and stored_fingerprint(engine) == fingerprint:
+        return 'current'
+
+    db.create_all()
+    upgrade_schema()
+    db.session.merge(AppMeta(key=SCHEMA_KEY, value=fingerprint))
+    db.session.commit()
+    return 'applied'
+
+
+def prewarm(app):
+    """
+    Render the first records page and API page once so template compilation,
+    SQL statement caches, the per-engine trigger checks and the group list are
+    ready before the first real request.
+    """
+    client = app.test_client()
+    for url in ('/records', '/api/records'):
+        resp = client.get(url)
+        if resp.status_code != 200:
+            app.logger.warning("Pre-warm of %s returned %s", url, resp.status_code)
@@ -0,0 +1,208 @@
+"""
+Typeahead for the add-item form.
+
+An in-memory, sorted list of normalized descriptions (the same key the
+duplicate check uses) answers prefix queries with a binary search, so a
+suggestion costs microseconds and can be asked for on every keystroke.
+
+The index is built on the first request. ORM writes made through db.session
+(the add form, single deletes) are applied to it as they commit. Anything the
+session events can't see (bulk Core inserts/deletes from imports and the batch
+API, or another worker process) moves the description counter kept next to the
+catalog version, which is checked at most every SUGGEST_RECHECK_SECONDS; a
+moved counter rebuilds the index. Price-only updates leave that counter alone,
+so repricing never reloads the index. Without a catalog version (non-SQLite)
+the index is rebuilt when it is older than SUGGEST_MAX_AGE seconds.
+Suggestions are advisory: the unique description key stays the authority when
+the form is saved.
+"""
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, text
+from catalog import description_version, version_enabled
+from extensions import db
+from models import Item, normalize_description
+from sqlite_profile import RoutingSession
+
+
+class SuggestIndex:
+    """Sorted-prefix index of description keys for one app."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_limit = app.config.get('SUGGEST_LIMIT', 8)
+        self.max_limit = app.config.get('SUGGEST_MAX_LIMIT', 25)
+        self.recheck = app.config.get('SUGGEST_RECHECK_SECONDS', 2.0)
+        self.max_age = app.config.get('SUGGEST_MAX_AGE', 60)
+        self._reset()
+        app.extensions['suggest'] = self
+
+    def _reset(self):
+        self.keys = []  # sorted normalized descriptions
+        self.entries = []  # (id, description), parallel to keys
+        self.built = False
+        self.version = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+
+    # -- build / freshness ---------------------------------------------------
+
+    def rebuild(self):
+        """Reload every description key from the database."""
+        version = description_version()
+        rows = db.session.execute(
+            select(Item.description_key, Item.id, Item.description)
+            .where(Item.description_key.isnot(None))).all()
+        rows.sort()
+        keys = [r[0] for r in rows]
+        entries = [(r[1], r[2]) for r in rows]
+        now = time.monotonic()
+        with self._lock:
+            self.keys, self.entries = keys, entries
+            self.version, self.built = version, True
+            self.built_at = self.checked_at = now
+        return len(keys)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if not self.built:
+            self.rebuild()
+        elif now - self.checked_at >= self.recheck:
+            self.checked_at = now
+            if version_enabled():
+                if description_version() != self.version:
+                    self.rebuild()
+            elif now - self.built_at >= self.max_age:
+                self.rebuild()
+
+    # -- queries ---------------------------------------------------------------
+
+    def suggest(self, query, limit=None, exclude_id=None):
+        """
+        Up to `limit` descriptions whose normalized form starts with the
+        normalized `query`, in key order, plus the exact duplicate if there is
+        one. `exclude_id` (the item being edited) is never reported.
+        """
+        limit = max(1, min(limit or self.default_limit, self.max_limit))
+        prefix = normalize_description(query)
+        result = {"query": prefix, "exact": False, "duplicate": None, "items": []}
+        if not prefix:
+            return result
+        self._ensure_fresh()
+        with self._lock:
+            keys, entries = self.keys, self.entries
+            i = bisect_left(keys, prefix)
+            n = len(keys)
+            items = result["items"]
+            while i < n and keys[i].startswith(prefix) and len(items) < limit:
+                item_id, description = entries[i]
+                if item_id != exclude_id:
+                    items.append({"id": item_id, "description": description})
+                    if keys[i] == prefix:
+                        result["exact"] = True
+                        result["duplicate"] = items[-1]
+                i += 1
+        return result
+
+    # -- incremental updates -----------------------------------------------------
+
+    def _apply(self, changes):
+        for op, key, item_id, description in changes:
+            i = bisect_left(self.keys, key)
+            if op == 'remove':
+                if i < len(self.keys) and self.keys[i] == key and self.entries[i][0] == item_id:
+                    del self.keys[i]
+                    del self.entries[i]
+            else:
+                if i < len(self.keys) and self.keys[i] == key:
+                    self.entries[i] = (item_id, description)
+                else:
+                    self.keys.insert(i, key)
+                    self.entries.insert(i, (item_id, description))
+
+    def committed(self, pending):
+        """Apply a committed transaction's ORM changes; keep the version if nothing else moved it."""
+        with self._lock:
+            if not self.built:
+                return
+            self._apply(pending['changes'])
+            if not pending['broken'] and self.version == pending['pre']:
+                self.version = pending['post']
+
+
+def _index():
+    return current_app.extensions.get('suggest') if has_app_context() else None
+
+
+def _current_version(session):
+    if not version_enabled():
+        return None
+    return session.connection().execute(text("SELECT descriptions FROM catalog_version WHERE id = 1")).scalar()
+
+
+# ORM writes: collect description changes per transaction, apply on commit
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _before_flush(session, flush_context, instances):
+    index = _index()
+    if index is None or not index.built:
+        return
+    if not any(isinstance(obj, Item) for obj in (*session.new, *session.dirty, *session.deleted)):
+        return
+    version = _current_version(session)
+    pending = session.info.get('suggest_pending')
+    if pending is None:
+        session.info['suggest_pending'] = {'pre': version, 'post': version, 'broken': False, 'changes': []}
+    elif pending['post'] != version:
+        pending['broken'] = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    pending = session.info.get('suggest_pending')
+    if pending is None:
+        return
+    changes = pending['changes']
+    for obj in session.deleted:
+        if isinstance(obj, Item):
+            key = inspect(obj).attrs.description_key.history
+            old = (key.deleted or key.unchanged or [None])[0]
+            if old:
+                changes.append(('remove', old, obj.id, None))
+    for obj in (*session.new, *session.dirty):
+        if not isinstance(obj, Item):
+            continue
+        history = inspect(obj).attrs.description_key.history
+        if obj in session.new or history.has_changes():
+            for old in history.deleted or ():
+                if old:
+                    changes.append(('remove', old, obj.id, None))
+            if obj.description_key:
+                changes.append(('add', obj.description_key, obj.id, obj.description))
+        elif inspect(obj).attrs.description.history.has_changes() and obj.description_key:
+            # same key, new spelling: refresh the displayed description
+            changes.append(('add', obj.description_key, obj.id, obj.description))
+    pending['post'] = _current_version(session)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    pending = session.info.pop('suggest_pending', None)
+    index = _index()
+    if pending is not None and index is not None:
+        index.committed(pending)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('suggest_pending', None)
+
+
+suggest_index = SuggestIndex()